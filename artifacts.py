@@ -0,0 +1,92 @@
+import os
+import uuid
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from metrics import metrics
+from config import INGEST_CONFIG
+
+logger = logging.getLogger(__name__)
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """Return the sha256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ArtifactStore:
+    """Content-addressed store for extracted images and tables.
+
+    Artifacts live at <root>/<kind>/<sha256[:2]>/<sha256><ext>, so identical content from any
+    document is written once and always gets the same path. Writes happen on a background
+    thread; flush() waits for them.
+    """
+
+    def __init__(self, root, max_writers=2):
+        self.root = root
+        self.max_writers = max_writers
+        self.written, self.deduplicated = 0, 0
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._executor, self._pid = None, None
+
+    def _path(self, kind, digest, extension):
+        return os.path.join(self.root, kind, digest[:2], f"{digest}{extension}")
+
+    def _submit(self, path, write):
+        """Schedule write(tmp_path) unless the artifact exists or is already being written."""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_writers, thread_name_prefix="artifacts")
+                self._in_flight, self._pid = {}, os.getpid()
+            if path in self._in_flight or os.path.exists(path):
+                self.deduplicated += 1
+                return path
+            self._in_flight[path] = self._executor.submit(self._write, path, write)
+            self.written += 1
+        return path
+
+    def _write(self, path, write):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        root, extension = os.path.splitext(path)
+        tmp_path = f"{root}.{uuid.uuid4().hex}.tmp{extension}"
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, path)
+            metrics.inc("bytes_total", os.path.getsize(path), pipeline="ingest", kind="artifact")
+        except Exception as e:
+            logger.error(f"Error writing artifact {path}: {e}")
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            with self._lock:
+                self._in_flight.pop(path, None)
+
+    def put_bytes(self, kind, data, extension):
+        """Store raw bytes and return their content-addressed path."""
+        path = self._path(kind, hashlib.sha256(data).hexdigest(), extension)
+
+        def write(tmp_path):
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+        return self._submit(path, write)
+
+    def put_dataframe(self, dataframe):
+        """Store a table as an Excel file keyed by its CSV content and return its path."""
+        digest = hashlib.sha256(dataframe.to_csv().encode("utf-8")).hexdigest()
+        return self._submit(self._path("tables", digest, ".xlsx"), dataframe.to_excel)
+
+    def flush(self):
+        """Wait until every scheduled write has finished."""
+        with self._lock:
+            pending = list(self._in_flight.values()) if self._pid == os.getpid() else []
+        wait(pending)
+
+    def stats(self):
+        """Return how many artifacts were written and how many were deduplicated."""
+        return {"written": self.written, "deduplicated": self.deduplicated}
+
+artifact_store = ArtifactStore(INGEST_CONFIG["artifact_dir"])
@@ -0,0 +1,41 @@
+"""Micro-benchmark for the blocked-term matcher.
+
+Times TermMatcher.contains against the previous per-term substring loop as the term list
+grows, on a fixed-size bot response. Run from the repository root:
+
+    python benchmarks/bench_blocked_terms.py
+"""
+import os
+import sys
+import json
+import random
+import string
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from term_matcher import TermMatcher
+
+def random_word(rng, length):
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(length))
+
+def naive_contains(terms, text):
+    lowered = text.lower()
+    return any(term.lower() in lowered for term in terms)
+
+def main():
+    rng = random.Random(0)
+    response = " ".join(random_word(rng, rng.randint(2, 10)) for _ in range(800))
+    results = []
+    for term_count in (10, 100, 1000, 5000):
+        terms = [" ".join(random_word(rng, rng.randint(4, 12)) for _ in range(rng.randint(1, 3)))
+                 for _ in range(term_count)]
+        matcher = TermMatcher(terms)
+        runs = 20
+        matcher_ms = timeit.timeit(lambda: matcher.contains(response), number=runs) / runs * 1000
+        naive_ms = timeit.timeit(lambda: naive_contains(terms, response), number=runs) / runs * 1000
+        results.append({"terms": term_count, "response_chars": len(response),
+                        "matcher_ms": round(matcher_ms, 3), "naive_ms": round(naive_ms, 3)})
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
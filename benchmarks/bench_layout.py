@@ -0,0 +1,121 @@
+"""Micro-benchmark for the page layout index.
+
+Times caption lookup for every table and image, the table overlap filter and text chunking on
+synthetic dense pages, with PageLayout against the previous scans over all blocks. Also times
+reading a generated datasheet page with page.get_text("blocks") and with PageLayout.from_page.
+Run from the repository root:
+
+    python benchmarks/bench_layout.py
+"""
+import os
+import sys
+import json
+import random
+import timeit
+import fitz
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from layout import PageLayout
+from utils import extract_text_around_item, process_text_blocks
+
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792
+
+def naive_text_around_item(text_blocks, bbox, page_height, threshold_percentage=0.1):
+    before_text, after_text = "", ""
+    vertical_thresh = page_height * threshold_percentage
+    horiz_thresh = bbox.width * threshold_percentage
+    for block in text_blocks:
+        block_bbox = fitz.Rect(block[:4])
+        vertical_dist = min(abs(block_bbox.y1 - bbox.y0), abs(block_bbox.y0 - bbox.y1))
+        horiz_overlap = max(0, min(block_bbox.x1, bbox.x1) - max(block_bbox.x0, bbox.x0))
+        if vertical_dist <= vertical_thresh and horiz_overlap >= -horiz_thresh:
+            if block_bbox.y1 < bbox.y0 and not before_text:
+                before_text = block[4]
+            elif block_bbox.y0 > bbox.y1 and not after_text:
+                after_text = block[4]
+                break
+    return before_text, after_text
+
+def naive_text_blocks(text_blocks, table_bboxes, char_count_threshold=500):
+    grouped_blocks, current_group, current_char_count = [], [], 0
+    for block in text_blocks:
+        if current_char_count + len(block[4]) <= char_count_threshold:
+            current_group.append(block)
+            current_char_count += len(block[4])
+        else:
+            if current_group:
+                grouped_blocks.append((current_group[0], "\n".join(b[4] for b in current_group)))
+            current_group, current_char_count = [block], len(block[4])
+    if current_group:
+        grouped_blocks.append((current_group[0], "\n".join(b[4] for b in current_group)))
+    return [(heading, content) for heading, content in grouped_blocks
+            if not any(fitz.Rect(heading[:4]).intersects(bbox) for bbox in table_bboxes)]
+
+def dense_page(rng, block_count, item_count):
+    """Two columns of short blocks with a heading every ten rows, and tables and figures placed over them."""
+    blocks, sizes = [], []
+    row_height = PAGE_HEIGHT * 0.8 / (block_count // 2)
+    for i in range(block_count):
+        column, row = i % 2, i // 2
+        y0 = PAGE_HEIGHT * 0.1 + row * row_height
+        y1 = y0 + row_height * 0.7
+        x0 = 40 + column * 290
+        heading = i % 20 < 2
+        text = f"Section {i // 20}\n" if heading else " ".join(f"w{rng.randint(0, 999)}" for _ in range(12)) + "\n"
+        blocks.append((x0, y0, x0 + 260, y1, text, i, 0))
+        sizes.append(14.0 if heading else 9.0)
+    items = []
+    for _ in range(item_count):
+        x0 = rng.choice((40, 330))
+        y0 = rng.uniform(PAGE_HEIGHT * 0.1, PAGE_HEIGHT * 0.85)
+        items.append(fitz.Rect(x0, y0, x0 + 240, y0 + rng.uniform(20, 60)))
+    return blocks, sizes, items
+
+def bench_queries(rng):
+    results = []
+    for block_count, item_count in ((50, 5), (200, 20), (1000, 50), (4000, 200)):
+        blocks, sizes, items = dense_page(rng, block_count, item_count)
+        tables = items[:len(items) // 2]
+
+        def naive():
+            for item in items:
+                naive_text_around_item(blocks, item, PAGE_HEIGHT)
+            naive_text_blocks(blocks, tables)
+
+        def indexed():
+            layout = PageLayout(blocks, sizes)
+            for item in items:
+                extract_text_around_item(layout, item, PAGE_HEIGHT)
+            process_text_blocks(layout, exclude_bboxes=tables)
+
+        runs = max(1, 2000 // block_count)
+        naive_ms = timeit.timeit(naive, number=runs) / runs * 1000
+        indexed_ms = timeit.timeit(indexed, number=runs) / runs * 1000
+        results.append({"blocks": block_count, "tables_and_images": item_count,
+                        "naive_ms": round(naive_ms, 3), "layout_ms": round(indexed_ms, 3),
+                        "speedup": round(naive_ms / indexed_ms, 1)})
+    return results
+
+def bench_extraction(rng):
+    """Time reading the blocks of a generated datasheet page, with and without font information."""
+    doc = fitz.open()
+    page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+    y = 90
+    while y < PAGE_HEIGHT - 90:
+        for x in (40, 330):
+            page.insert_text((x, y), f"Section {rng.randint(1, 99)}", fontsize=12, fontname="hebo")
+            page.insert_text((x, y + 14), " ".join(f"w{rng.randint(0, 999)}" for _ in range(6)), fontsize=7)
+        y += 30
+    runs = 50
+    blocks_ms = timeit.timeit(lambda: page.get_text("blocks", sort=True), number=runs) / runs * 1000
+    layout_ms = timeit.timeit(lambda: PageLayout.from_page(page), number=runs) / runs * 1000
+    layout = PageLayout.from_page(page)
+    return {"blocks": len(layout.blocks), "headings": len(layout.headings), "chunks": len(layout.chunks()),
+            "get_text_blocks_ms": round(blocks_ms, 3), "from_page_ms": round(layout_ms, 3)}
+
+def main():
+    rng = random.Random(0)
+    print(json.dumps({"queries": bench_queries(rng), "extraction": bench_extraction(rng)}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,382 @@
+"""Offline benchmark suite: ingestion and chat against local stand-ins for every NVIDIA endpoint.
+
+Starts benchmarks/mock_nvidia.py in-process, points the LLM, embedding, rerank, rails, image
+and DePlot clients at it, and measures on synthetic documents:
+
+    ingest   get_pdf_documents, process_ppt_file, load_multimodal_data on decks and
+             load_data_from_directory: pages/sec and remote calls per page
+    chat     /chat websocket sessions under N concurrent users:
+             p50/p99 turn latency, time to first token and throughput
+
+Both scenarios also report the per-stage time breakdown from the service's /metrics output.
+
+Everything runs in a temporary directory, so caches start cold. Results are printed as JSON
+together with the git commit, and written to --output if given, so runs can be compared
+across commits. Run from the repository root:
+
+    python benchmarks/bench_offline.py --latency-ms 40 --error-rate 0.01 --users 1 4 16
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import urllib.request
+import asyncio
+import logging
+import argparse
+import tempfile
+import platform
+import threading
+import subprocess
+import statistics
+from io import BytesIO
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.join(REPO_ROOT, "benchmarks"))
+from mock_nvidia import MockNvidiaServer
+
+MODELS = ["meta/llama-3.1-70b-instruct", "nvidia/nv-embedqa-e5-v5", "nvidia/nv-rerankqa-mistral-4b-v3"]
+WORDS = ("router switch fibre antenna signal latency firmware reset port cable splice tower backhaul modem "
+         "outage ticket voltage alarm carrier bandwidth protocol gateway").split()
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return None
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 1)
+
+def stage_breakdown(exposition, pipeline):
+    """Summarise rag_stage_seconds for one pipeline from Prometheus text: calls, total and mean ms."""
+    sums, counts = {}, {}
+    for line in exposition.splitlines():
+        for suffix, values in (("_sum{", sums), ("_count{", counts)):
+            if line.startswith("rag_stage_seconds" + suffix) and f'pipeline="{pipeline}"' in line:
+                stage = line.split('stage="', 1)[1].split('"', 1)[0]
+                values[stage] = float(line.rsplit(" ", 1)[1])
+    return {stage: {"calls": int(counts[stage]), "total_ms": round(sums[stage] * 1000, 1),
+                    "mean_ms": round(sums[stage] * 1000 / counts[stage], 2) if counts[stage] else None}
+            for stage in sorted(counts, key=lambda stage: -sums.get(stage, 0))}
+
+def sentence(rng, words=12):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+def chart_png(rng):
+    """A bar chart on a white background, as triage would route to DePlot."""
+    from PIL import Image, ImageDraw
+    img = Image.new("RGB", (480, 320), "white")
+    draw = ImageDraw.Draw(img)
+    for i in range(6):
+        height = rng.randint(40, 280)
+        draw.rectangle([30 + i * 75, 300 - height, 80 + i * 75, 300], fill=(30, 90 + 20 * i, 200))
+    draw.line([20, 300, 470, 300], fill="black", width=2)
+    out = BytesIO()
+    img.save(out, format="PNG")
+    return out.getvalue()
+
+def photo_png(rng):
+    """A smooth colour gradient with grain, as triage would send to the VLM."""
+    from PIL import Image
+    base = (rng.randint(60, 200), rng.randint(60, 200), rng.randint(60, 200))
+    img = Image.new("RGB", (320, 240))
+    img.putdata([((base[0] + x) % 256, (base[1] + y) % 256, (base[2] + rng.randint(0, 40)) % 256)
+                 for y in range(240) for x in range(320)])
+    out = BytesIO()
+    img.save(out, format="PNG")
+    return out.getvalue()
+
+def make_pdf(path, pages, rng):
+    """Write a PDF whose pages mix text, a ruled table, a chart and a photo."""
+    import fitz
+    doc = fitz.open()
+    for page_number in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Section {page_number + 1}: unit RT-AC{rng.randint(10, 99)}U, "
+                                   f"error E{rng.randint(1000, 9999)}", fontsize=14)
+        page.insert_textbox(fitz.Rect(72, 90, 540, 250), " ".join(sentence(rng) for _ in range(8)), fontsize=10)
+        if page_number % 2 == 0:
+            top = 270
+            for row in range(5):
+                for col in range(3):
+                    cell = fitz.Rect(72 + col * 150, top + row * 20, 222 + col * 150, top + (row + 1) * 20)
+                    page.draw_rect(cell, color=(0, 0, 0), width=0.8)
+                    text = ["Site", "Mbps", "Alarms"][col] if row == 0 else str(rng.randint(1, 500))
+                    page.insert_text((cell.x0 + 4, cell.y1 - 6), text, fontsize=9)
+        if page_number % 3 == 0:
+            page.insert_image(fitz.Rect(72, 400, 372, 600), stream=chart_png(rng))
+        elif page_number % 3 == 1:
+            page.insert_image(fitz.Rect(72, 400, 312, 580), stream=photo_png(rng))
+    doc.save(path)
+    doc.close()
+
+def make_deck(path, slides, rng):
+    """Write a PowerPoint deck with a title, bullets, notes and a picture per slide."""
+    from pptx import Presentation
+    from pptx.util import Inches
+    prs = Presentation()
+    for slide_number in range(slides):
+        slide = prs.slides.add_slide(prs.slide_layouts[1])
+        slide.shapes.title.text = f"Procedure {slide_number + 1}"
+        slide.placeholders[1].text = "\n".join(sentence(rng, 6) for _ in range(3))
+        slide.notes_slide.notes_text_frame.text = sentence(rng)
+        picture = chart_png(rng) if slide_number % 2 == 0 else photo_png(rng)
+        slide.shapes.add_picture(BytesIO(picture), Inches(5), Inches(4.5), width=Inches(4))
+    prs.save(path)
+
+def measure(mock, pages, run):
+    """Run an ingestion function and report throughput and remote calls per page."""
+    before = mock.stats()["calls"]
+    start = time.perf_counter()
+    documents = run()
+    seconds = time.perf_counter() - start
+    after = mock.stats()["calls"]
+    calls = {endpoint: after[endpoint] - before.get(endpoint, 0) for endpoint in after
+             if after[endpoint] != before.get(endpoint, 0)}
+    return {"pages": pages, "documents": len(documents), "seconds": round(seconds, 3),
+            "pages_per_sec": round(pages / seconds, 2) if seconds else None,
+            "remote_calls": sum(calls.values()), "remote_calls_per_page": round(sum(calls.values()) / pages, 2),
+            "remote_calls_by_endpoint": calls}
+
+def bench_ingest(mock, args, corpus_dir):
+    from document_processors import get_pdf_documents, process_ppt_file, load_data_from_directory, load_multimodal_data
+    from metrics import metrics
+    from config import INGEST_CONFIG
+    rng = random.Random(args.seed)
+    results = {}
+
+    pdf_paths = []
+    for i in range(args.pdfs):
+        path = os.path.join(corpus_dir, "pdf", f"manual_{i}.pdf")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        make_pdf(path, args.pages, rng)
+        pdf_paths.append(path)
+
+    def run_pdfs():
+        documents = []
+        for path in pdf_paths:
+            with open(path, "rb") as f:
+                documents += get_pdf_documents(f)
+        return documents
+    results["get_pdf_documents"] = measure(mock, args.pdfs * args.pages, run_pdfs)
+
+    if shutil.which(INGEST_CONFIG["office_binary"]) is None:
+        results["process_ppt_file"] = {"skipped": f"{INGEST_CONFIG['office_binary']} not found"}
+    else:
+        deck_sets = {}
+        for name in ("decks", "batched_decks"):
+            deck_sets[name] = []
+            for i in range(args.decks):
+                path = os.path.join(corpus_dir, name, f"deck_{i}.pptx")
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                make_deck(path, args.slides, rng)
+                deck_sets[name].append(path)
+        slides = args.decks * args.slides
+        results["process_ppt_file"] = measure(
+            mock, slides, lambda: [doc for path in deck_sets["decks"] for doc in process_ppt_file(path)])
+        # A file list is converted in batches while earlier decks are processed.
+        results["load_multimodal_data_decks"] = measure(
+            mock, slides, lambda: load_multimodal_data(deck_sets["batched_decks"]))
+        results["load_multimodal_data_decks_warm"] = measure(
+            mock, slides, lambda: load_multimodal_data(deck_sets["batched_decks"]))
+
+    directory = os.path.join(corpus_dir, "directory")
+    os.makedirs(directory)
+    for i in range(args.pdfs):
+        make_pdf(os.path.join(directory, f"report_{i}.pdf"), args.pages, rng)
+    pages = args.pdfs * args.pages
+    results["load_data_from_directory"] = measure(mock, pages, lambda: load_data_from_directory(directory))
+    results["load_data_from_directory_warm"] = measure(mock, pages, lambda: load_data_from_directory(directory))
+    results["stages"] = stage_breakdown(metrics.render(), "ingest")
+    return results
+
+async def chat_user(url, user, turns, latencies, first_tokens, failures):
+    import websockets
+    async with websockets.connect(url, max_size=None) as websocket:
+        for turn in range(turns):
+            question = (f"How do I clear error E{1000 + 37 * user + turn} on the RT-AC68U "
+                        f"{WORDS[(user + turn) % len(WORDS)]}?")
+            start = time.perf_counter()
+            first_token = None
+            await websocket.send(json.dumps({"role": "user", "content": question, "stream": True}))
+            while True:
+                frame = json.loads(await websocket.recv())
+                if frame.get("type") == "token":
+                    if first_token is None:
+                        first_token = time.perf_counter()
+                    continue
+                break
+            elapsed = time.perf_counter() - start
+            if frame.get("type") in ("end", "retract") or frame.get("role") == "assistant":
+                latencies.append(elapsed * 1000)
+                first_tokens.append(((first_token or time.perf_counter()) - start) * 1000)
+            else:
+                failures.append(frame)
+
+async def run_users(url, users, turns):
+    latencies, first_tokens, failures = [], [], []
+    start = time.perf_counter()
+    outcomes = await asyncio.gather(*(chat_user(url, user, turns, latencies, first_tokens, failures)
+                                      for user in range(users)), return_exceptions=True)
+    seconds = time.perf_counter() - start
+    errors = [repr(outcome) for outcome in outcomes if isinstance(outcome, BaseException)]
+    return {"users": users, "turns": len(latencies), "seconds": round(seconds, 3),
+            "turns_per_sec": round(len(latencies) / seconds, 2) if seconds else None,
+            "latency_ms_p50": percentile(latencies, 0.5), "latency_ms_p99": percentile(latencies, 0.99),
+            "latency_ms_mean": round(statistics.mean(latencies), 1) if latencies else None,
+            "ttft_ms_p50": percentile(first_tokens, 0.5), "ttft_ms_p99": percentile(first_tokens, 0.99),
+            "failed_turns": len(failures), "failed_sessions": len(errors), "errors": errors[:5]}
+
+async def long_session(url, turns, window=5):
+    """One user chatting for many turns; compares the first and last turns' latency and condense prompt."""
+    import websockets
+    latencies, prompt_tokens, summaries = [], [], 0
+    async with websockets.connect(url, max_size=None) as websocket:
+        for turn in range(turns):
+            question = f"What should I check next for error E{2000 + turn} on the RT-AC68U {WORDS[turn % len(WORDS)]}?"
+            start = time.perf_counter()
+            await websocket.send(json.dumps({"role": "user", "content": question, "trace": True}))
+            frame = json.loads(await websocket.recv())
+            latencies.append((time.perf_counter() - start) * 1000)
+            while frame.get("type") != "trace":
+                frame = json.loads(await websocket.recv())
+            spans = frame["spans"]
+            prompt_tokens.append(sum(span.get("prompt_tokens", 0) for span in spans if span["name"] == "condense"))
+            summaries += sum(span["name"] == "summarize" for span in spans)
+    mean = lambda values: round(statistics.mean(values), 1)
+    return {"turns": turns, "summaries": summaries,
+            "latency_ms_first": mean(latencies[:window]), "latency_ms_last": mean(latencies[-window:]),
+            "condense_prompt_tokens_first": mean(prompt_tokens[:window]),
+            "condense_prompt_tokens_last": mean(prompt_tokens[-window:]),
+            "condense_prompt_tokens_max": max(prompt_tokens)}
+
+def bench_chat(mock, args, corpus_dir):
+    import uvicorn
+    import nvidia_rag
+    from document_processors import iter_multimodal_data
+    from artifacts import hash_file
+    for name in ("nemoguardrails", "httpx", "indexing", "nvidia_rag"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    rng = random.Random(args.seed + 1)
+    corpus = os.path.join(corpus_dir, "chat")
+    os.makedirs(corpus)
+    start = time.perf_counter()
+    for i in range(args.pdfs):
+        path = os.path.join(corpus, f"guide_{i}.pdf")
+        make_pdf(path, args.pages, rng)
+        nvidia_rag.index_source(path, hash_file(path), lambda path=path: iter_multimodal_data([path]))
+    index_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    nvidia_rag.get_rails()
+    rails_seconds = time.perf_counter() - start
+
+    server = uvicorn.Server(uvicorn.Config(nvidia_rag.app, host="127.0.0.1", port=args.app_port, log_level="warning"))
+    thread = threading.Thread(target=server.run, name="bench-app", daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+
+    results = {"index_seconds": round(index_seconds, 3), "rails_load_seconds": round(rails_seconds, 3), "runs": []}
+    try:
+        for users in args.users:
+            before = mock.stats()["calls"]
+            run = asyncio.run(run_users(f"ws://127.0.0.1:{port}/chat", users, args.turns))
+            after = mock.stats()["calls"]
+            run["remote_calls_by_endpoint"] = {endpoint: after[endpoint] - before.get(endpoint, 0)
+                                               for endpoint in after if after[endpoint] != before.get(endpoint, 0)}
+            results["runs"].append(run)
+        if args.session_turns:
+            results["long_session"] = asyncio.run(long_session(f"ws://127.0.0.1:{port}/chat", args.session_turns))
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+            results["stages"] = stage_breakdown(response.read().decode("utf-8"), "chat")
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+    results["semantic_cache"] = nvidia_rag.answer_cache.stats()
+    results["rerank"] = nvidia_rag.reranker.stats()
+    return results
+
+def rails_config_copy(mock_url, workdir):
+    """Copy the rails config, with its embeddings served by the mock instead of a local model."""
+    import yaml
+    path = os.path.join(workdir, "rails_config")
+    shutil.copytree(os.path.join(REPO_ROOT, "config"), path, ignore=shutil.ignore_patterns("__pycache__"))
+    with open(os.path.join(path, "config.yml"), "r", encoding="utf-8") as f:
+        config = yaml.safe_load(f)
+    config["models"].append({"type": "embeddings", "engine": "nvidia_ai_endpoints", "model": MODELS[1]})
+    with open(os.path.join(path, "config.yml"), "w", encoding="utf-8") as f:
+        yaml.safe_dump(config, f, sort_keys=False)
+    return path
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline ingestion and chat benchmarks against mock NVIDIA endpoints.")
+    parser.add_argument("--scenario", choices=["ingest", "chat", "all"], default="all")
+    parser.add_argument("--latency-ms", type=float, default=40, help="mock latency per request")
+    parser.add_argument("--jitter-ms", type=float, default=10, help="extra random mock latency per request")
+    parser.add_argument("--token-ms", type=float, default=5, help="mock latency per streamed token")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of mock requests failing with 503")
+    parser.add_argument("--pdfs", type=int, default=3)
+    parser.add_argument("--pages", type=int, default=8)
+    parser.add_argument("--decks", type=int, default=2)
+    parser.add_argument("--slides", type=int, default=6)
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 4, 16], help="concurrent chat users per run")
+    parser.add_argument("--turns", type=int, default=5, help="chat turns per user")
+    parser.add_argument("--session-turns", type=int, default=40, help="turns of the single long chat session")
+    parser.add_argument("--semantic-cache", action="store_true",
+                        help="keep the semantic answer cache on; the synthetic questions are near-duplicates")
+    parser.add_argument("--app-port", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    mock = MockNvidiaServer(MODELS, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                            error_rate=args.error_rate, token_ms=args.token_ms, seed=args.seed).start()
+    workdir = tempfile.mkdtemp(prefix="bench_offline_")
+    os.environ.update({
+        "NVIDIA_API_KEY": "nvapi-offline-benchmark",
+        "NVIDIA_BASE_URL": f"{mock.url}/v1",
+        "IMAGE_MODEL_API": f"{mock.url}/vlm/image",
+        "GRAPH_MODEL_API": f"{mock.url}/vlm/graph",
+        "RAILS_CONFIG_PATH": rails_config_copy(mock.url, workdir),
+        "BLOCKED_TERMS_PATH": os.path.join(REPO_ROOT, "config", "rails", "blocked_terms.txt"),
+        "SEMANTIC_CACHE": "true" if args.semantic_cache else "false",
+    })
+    # Relative cache, artifact and index paths all land in the temporary directory.
+    os.chdir(workdir)
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "params": vars(args),
+    }
+    try:
+        if args.scenario in ("ingest", "all"):
+            results["ingest"] = bench_ingest(mock, args, os.path.join(workdir, "corpus"))
+        if args.scenario in ("chat", "all"):
+            results["chat"] = bench_chat(mock, args, os.path.join(workdir, "corpus"))
+        results["mock"] = mock.stats()
+    finally:
+        mock.stop()
+        os.chdir(REPO_ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+
+if __name__ == "__main__":
+    main()
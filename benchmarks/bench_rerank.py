@@ -0,0 +1,96 @@
+"""Benchmark of the two-stage (retrieve + rerank) chat path against plain top-20 retrieval.
+
+For each question, runs retrieval and a full streamed synthesis through ChatSession and
+records the context size sent to the LLM and the end-to-end latency. The rerank path is run
+twice to show the effect of the rerank score cache. Needs NVIDIA_API_KEY and an existing
+index in INDEX_CHROMA_PATH. Run from the repository root:
+
+    python benchmarks/bench_rerank.py [questions.txt]
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import chromadb
+from llama_index.core import Settings
+from llama_index.core.schema import MetadataMode
+from llama_index.embeddings.nvidia import NVIDIAEmbedding
+from llama_index.llms.nvidia import NVIDIA
+from llama_index.postprocessor.nvidia_rerank import NVIDIARerank
+from cache import ModelCache
+from chat_session import ChatSession
+from indexing import IndexManager
+from lexical import HybridRetriever
+from rerank import CachedReranker
+from utils import set_environment_variables
+from config import LLM_CONFIG, INDEX_CONFIG, RETRIEVAL_CONFIG, RERANK_CONFIG
+
+DEFAULT_QUESTIONS = [
+    "What are the main components of a 5G core network?",
+    "How do I troubleshoot high packet loss on a fibre link?",
+    "Which frequency bands does the device support?",
+    "What does the error code in the installation guide mean?",
+]
+
+def run(session, questions):
+    latencies, context_chars, node_counts = [], [], []
+    for question in questions:
+        start = time.perf_counter()
+        nodes = session.prepare(question).nodes
+        "".join(session.synthesize(question, nodes))
+        latencies.append((time.perf_counter() - start) * 1000)
+        context_chars.append(sum(len(node.node.get_content(metadata_mode=MetadataMode.LLM)) for node in nodes))
+        node_counts.append(len(nodes))
+    return {
+        "nodes": statistics.mean(node_counts),
+        "context_chars": statistics.mean(context_chars),
+        "estimated_prompt_tokens": statistics.mean(context_chars) / 4,
+        "latency_ms_median": round(statistics.median(latencies), 1),
+        "latency_ms_max": round(max(latencies), 1),
+    }
+
+def main():
+    questions = DEFAULT_QUESTIONS
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "r", encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+
+    set_environment_variables()
+    Settings.embed_model = NVIDIAEmbedding(model=LLM_CONFIG["embed_model"], truncate="END")
+    Settings.llm = NVIDIA(model=LLM_CONFIG["llm"])
+    manager = IndexManager(chromadb.PersistentClient(path=INDEX_CONFIG["chroma_path"]), INDEX_CONFIG["collection"],
+                           INDEX_CONFIG["manifest_path"])
+    baseline = ChatSession(manager, Settings.llm, None, [], lambda snapshot: snapshot.retriever(20))
+
+    reranker = CachedReranker(
+        NVIDIARerank(model=RERANK_CONFIG["model"], top_n=RERANK_CONFIG["candidates"]),
+        ModelCache(os.path.join(tempfile.mkdtemp(), "rerank_cache.db"), 64 * 1024 * 1024),
+        top_n=RERANK_CONFIG["top_n"],
+        skip_margin=RERANK_CONFIG["skip_margin"],
+    )
+
+    def first_stage(snapshot):
+        if not RETRIEVAL_CONFIG["hybrid"]:
+            return snapshot.retriever(RERANK_CONFIG["candidates"])
+        return HybridRetriever(snapshot.retriever(RETRIEVAL_CONFIG["vector_top_k"]),
+                               manager.lexical_index, manager.collection,
+                               lexical_top_k=RETRIEVAL_CONFIG["lexical_top_k"],
+                               top_k=RERANK_CONFIG["candidates"], rrf_k=RETRIEVAL_CONFIG["rrf_k"],
+                               version=snapshot.version)
+    two_stage = ChatSession(manager, Settings.llm, None, [], first_stage, node_postprocessors=[reranker])
+
+    results = {
+        "questions": len(questions),
+        "top20": run(baseline, questions),
+        "rerank_cold": run(two_stage, questions),
+        "rerank_warm": run(two_stage, questions),
+        "rerank_stats": reranker.stats(),
+    }
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""Local stand-in for the NVIDIA endpoints used by the service, for offline benchmarks.
+
+Serves, under one base URL:
+
+    GET  /v1/models              model listing used by the NVIDIA clients
+    POST /v1/chat/completions    LLM and rails LLM, streamed or not
+    POST /v1/completions         plain completions
+    POST /v1/embeddings          deterministic hashed bag-of-words vectors
+    POST /v1/ranking             reranking by word overlap
+    POST /vlm/image              image description (IMAGE_MODEL_API)
+    POST /vlm/graph              DePlot chart data (GRAPH_MODEL_API)
+
+Every request waits latency_ms (plus up to jitter_ms) and fails with a 503 with probability
+error_rate; streamed completions also wait token_ms per token. Per-endpoint call and error
+counts are available from stats(). Run standalone with:
+
+    python benchmarks/mock_nvidia.py --port 8900 --latency-ms 50
+"""
+import re
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EMBED_DIM = 384
+ANSWER = ("According to the field documentation, check the device status lights, confirm the configuration "
+          "of the RT-AC68U unit and restart it if error E1234 persists. Escalate if the issue remains.")
+DEPLOT_TABLE = "TITLE | Throughput by site\nSite | Mbps\nNorth | 120\nSouth | 95\nEast | 143"
+IMAGE_DESCRIPTION = "A photo of telecom equipment mounted in a rack with cables attached."
+
+def _words(text):
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+def embed(text):
+    """Unit-length hashed bag-of-words vector, so similar texts get similar vectors."""
+    vector = [0.0] * EMBED_DIM
+    for word in _words(text):
+        digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+        vector[int.from_bytes(digest[:4], "little") % EMBED_DIM] += 1.0 if digest[4] & 1 else -1.0
+    norm = sum(v * v for v in vector) ** 0.5 or 1.0
+    return [v / norm for v in vector]
+
+class MockNvidiaServer:
+    """Threaded HTTP server mimicking the NVIDIA API catalog endpoints."""
+
+    def __init__(self, models, port=0, latency_ms=0, jitter_ms=0, error_rate=0.0, token_ms=0, seed=0):
+        self.models = list(models)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.token_ms = token_ms
+        self.calls, self.errors = Counter(), Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-nvidia", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def stats(self):
+        """Return per-endpoint call and error counts."""
+        with self._lock:
+            return {"calls": dict(self.calls), "errors": dict(self.errors),
+                    "total_calls": sum(self.calls.values()), "total_errors": sum(self.errors.values())}
+
+    def _admit(self, endpoint):
+        """Count a call, wait the configured latency and decide whether it fails."""
+        with self._lock:
+            self.calls[endpoint] += 1
+            delay = (self.latency_ms + self._random.uniform(0, self.jitter_ms)) / 1000
+            failed = self._random.random() < self.error_rate
+            if failed:
+                self.errors[endpoint] += 1
+        time.sleep(delay)
+        return not failed
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, payload, status=200):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path.rstrip("/").endswith("/models"):
+                    self._send_json({"object": "list", "data": [
+                        {"id": model, "object": "model", "created": 0, "owned_by": "mock"} for model in server.models
+                    ]})
+                else:
+                    self._send_json({"error": "not found"}, 404)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                routes = {
+                    "/v1/chat/completions": ("chat", self._chat),
+                    "/v1/completions": ("completions", self._completions),
+                    "/v1/embeddings": ("embeddings", self._embeddings),
+                    "/v1/ranking": ("ranking", self._ranking),
+                    "/vlm/image": ("image", lambda r: self._vlm(r, IMAGE_DESCRIPTION)),
+                    "/vlm/graph": ("graph", lambda r: self._vlm(r, DEPLOT_TABLE)),
+                }
+                route = routes.get(self.path.rstrip("/"))
+                if route is None:
+                    self._send_json({"error": "not found"}, 404)
+                    return
+                endpoint, handle = route
+                if not server._admit(endpoint):
+                    self._send_json({"error": "mock failure"}, 503)
+                    return
+                handle(request)
+
+            def _chat(self, request):
+                prompt = " ".join(str(message.get("content", "")) for message in request.get("messages", []))
+                content = "No" if "(Yes or No)" in prompt else ANSWER
+                model = request.get("model", server.models[0])
+                if not request.get("stream"):
+                    self._send_json(_completion(model, content))
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                tokens = re.findall(r"\S+\s*", content)
+                for i, token in enumerate(tokens):
+                    time.sleep(server.token_ms / 1000)
+                    chunk = _chunk(model, {"role": "assistant", "content": token} if i == 0 else {"content": token})
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                self.wfile.write(f"data: {json.dumps(_chunk(model, {}, 'stop'))}\n\n".encode("utf-8"))
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+
+            def _completions(self, request):
+                self._send_json({"id": "cmpl-mock", "object": "text_completion", "created": int(time.time()),
+                                 "model": request.get("model", server.models[0]),
+                                 "choices": [{"index": 0, "text": ANSWER, "finish_reason": "stop", "logprobs": None}],
+                                 "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}})
+
+            def _embeddings(self, request):
+                texts = request.get("input", [])
+                texts = [texts] if isinstance(texts, str) else texts
+                tokens = sum(len(_words(text)) for text in texts)
+                self._send_json({"object": "list", "model": request.get("model", ""),
+                                 "data": [{"object": "embedding", "index": i, "embedding": embed(text)}
+                                          for i, text in enumerate(texts)],
+                                 "usage": {"prompt_tokens": tokens, "total_tokens": tokens}})
+
+            def _ranking(self, request):
+                query = set(_words(request.get("query", {}).get("text", "")))
+                scores = [len(query.intersection(_words(passage.get("text", "")))) - 0.01 * i
+                          for i, passage in enumerate(request.get("passages", []))]
+                order = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+                self._send_json({"rankings": [{"index": i, "logit": float(scores[i])} for i in order]})
+
+            def _vlm(self, request, content):
+                self._send_json(_completion("vlm", content))
+
+        return Handler
+
+def _completion(model, content):
+    return {"id": "chatcmpl-mock", "object": "chat.completion", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": len(content.split()), "total_tokens": 1 + len(content.split())}}
+
+def _chunk(model, delta, finish_reason=None):
+    return {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--token-ms", type=float, default=0)
+    parser.add_argument("--models", nargs="+", default=["meta/llama-3.1-70b-instruct", "nvidia/nv-embedqa-e5-v5",
+                                                        "nvidia/nv-rerankqa-mistral-4b-v3"])
+    args = parser.parse_args()
+    server = MockNvidiaServer(args.models, args.port, args.latency_ms, args.jitter_ms, args.error_rate, args.token_ms)
+    print(f"Serving mock NVIDIA endpoints on {server.url}")
+    server._server.serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+from config import CACHE_CONFIG
+
+class ModelCache:
+    """Disk-backed LRU cache for remote model responses, keyed by content hash."""
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits, self.misses = 0, 0
+        self._lock = threading.Lock()
+        self._conn, self._pid = None, None
+
+    @staticmethod
+    def make_key(content, model, prompt):
+        """Build a cache key from raw content bytes, model name and prompt."""
+        digest = hashlib.sha256()
+        for part in (content, model.encode("utf-8"), prompt.encode("utf-8")):
+            digest.update(hashlib.sha256(part).digest())
+        return digest.hexdigest()
+
+    def _connection(self):
+        """Open the SQLite store lazily, once per process."""
+        if self._conn is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+            self._conn.commit()
+            self._pid = os.getpid()
+        return self._conn
+
+    def get(self, key, count_miss=True):
+        """Return the cached value for a key, or None on a miss."""
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += count_miss
+                return None
+            conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, key, value):
+        """Store a value and evict least recently used entries over the size limit."""
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, len(value.encode("utf-8")), time.time())
+            )
+            self._evict(conn)
+            conn.commit()
+
+    def _evict(self, conn):
+        """Drop the oldest entries until the store fits within max_bytes."""
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY last_access").fetchall():
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def get_many(self, keys):
+        """Return a dict of the cached values found for the given keys."""
+        found = {}
+        with self._lock:
+            conn = self._connection()
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT key, value FROM entries WHERE key IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                found.update(rows)
+            now = time.time()
+            conn.executemany("UPDATE entries SET last_access = ? WHERE key = ?", [(now, key) for key in found])
+            conn.commit()
+            self.hits += len(found)
+            self.misses += len(set(keys)) - len(found)
+        return found
+
+    def set_many(self, items):
+        """Store several key/value pairs in one transaction."""
+        with self._lock:
+            conn = self._connection()
+            now = time.time()
+            conn.executemany(
+                "INSERT OR REPLACE INTO entries (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                [(key, value, len(value.encode("utf-8")), now) for key, value in items.items()]
+            )
+            self._evict(conn)
+            conn.commit()
+
+    def lookup(self, content, model, prompt):
+        """Return a cached response without computing it; a miss is not counted."""
+        return self.get(self.make_key(content, model, prompt), count_miss=False)
+
+    def get_or_compute(self, content, model, prompt, compute):
+        """Return a cached response or call compute() and store its result."""
+        key = self.make_key(content, model, prompt)
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def stats(self):
+        """Return hit/miss counters and current store size."""
+        with self._lock:
+            entries, size = self._connection().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size}
+
+    def clear(self):
+        """Remove every cached entry."""
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM entries")
+            conn.commit()
+
+class LazyModel:
+    """A model client, or a zero-argument factory that builds it on first use."""
+
+    def __init__(self, inner, model_type):
+        is_model = isinstance(inner, model_type)
+        self._model = inner if is_model else None
+        self._factory = None if is_model else inner
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if self._model is None:
+                self._model = self._factory()
+        return self._model
+
+class Counters:
+    """Thread-safe named counters, such as the request stats of a cached model wrapper."""
+
+    def __init__(self, *names):
+        self._values = dict.fromkeys(names, 0)
+        self._lock = threading.Lock()
+
+    def add(self, **increments):
+        with self._lock:
+            for name, value in increments.items():
+                self._values[name] += value
+
+    def snapshot(self):
+        """Return a copy of the counters."""
+        with self._lock:
+            return dict(self._values)
+
+model_cache = ModelCache(CACHE_CONFIG["path"], CACHE_CONFIG["max_bytes"])
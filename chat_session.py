@@ -0,0 +1,104 @@
+from llama_index.core import QueryBundle, Settings
+from llama_index.core.llms import MessageRole
+from llama_index.core.base.llms.generic_utils import messages_to_history_str
+from llama_index.core.query_engine import RetrieverQueryEngine
+from memory import ConversationMemory
+from metrics import metrics, estimate_tokens
+
+class PreparedTurn:
+    """Result of condensing a message: the standalone question and either nodes or a cached answer."""
+
+    def __init__(self, question, embedding=None, nodes=None, cached_answer=None, cache_version=None):
+        self.question = question
+        self.embedding = embedding
+        self.nodes = nodes
+        self.cached_answer = cached_answer
+        self.cache_version = cache_version
+
+class ChatSession:
+    """Condense, retrieve and synthesize stages of a chat turn, exposed separately.
+
+    Equivalent to CondenseQuestionChatEngine over a streaming query engine, but the stages can be
+    scheduled independently, e.g. alongside the input rail. Each turn pins the latest committed
+    index version; make_retriever(snapshot) builds the retriever for it, and node_postprocessors
+    (e.g. a reranker) run on the retrieved nodes before synthesis. The history used for condensing
+    starts from chat_history and is kept within memory_tokens by a ConversationMemory. Call close()
+    when the session ends so its version can be garbage-collected.
+    """
+
+    def __init__(self, index_manager, llm, condense_prompt, chat_history, make_retriever, answer_cache=None,
+                 node_postprocessors=None, memory_tokens=None, summary_tokens=256):
+        self.llm = llm
+        self.index_manager = index_manager
+        self.make_retriever = make_retriever
+        self.node_postprocessors = node_postprocessors
+        self.answer_cache = answer_cache
+        self.condense_prompt = condense_prompt
+        self.memory = ConversationMemory(llm, chat_history, memory_tokens, summary_tokens)
+        self.snapshot, self.query_engine = None, None
+
+    def refresh(self):
+        """Move to the latest committed index version if a newer one was published, by any process."""
+        self.index_manager.sync()
+        if self.snapshot is not None and self.snapshot.version == self.index_manager.version:
+            return
+        snapshot = self.index_manager.acquire()
+        self.close()
+        self.snapshot = snapshot
+        self.query_engine = RetrieverQueryEngine.from_args(self.make_retriever(snapshot), llm=self.llm,
+                                                           streaming=True, node_postprocessors=self.node_postprocessors)
+
+    def close(self):
+        """Release the pinned index version."""
+        if self.snapshot is not None:
+            self.snapshot.release()
+            self.snapshot = None
+
+    def condense(self, message):
+        """Rewrite a follow-up message as a standalone question."""
+        messages = self.memory.messages()
+        if not messages:
+            return message
+        chat_history = messages_to_history_str(messages)
+        prompt = self.condense_prompt.format(question=message, chat_history=chat_history)
+        with metrics.timed("chat", "condense", prompt_tokens=estimate_tokens(prompt)):
+            metrics.inc("remote_calls_total", service="llm", stage="condense")
+            question = self.llm.predict(self.condense_prompt, question=message, chat_history=chat_history)
+        metrics.inc("tokens_total", estimate_tokens(prompt), pipeline="chat", stage="condense", direction="prompt")
+        metrics.inc("tokens_total", estimate_tokens(question), pipeline="chat", stage="condense", direction="completion")
+        return question
+
+    def retrieve(self, question, embedding=None):
+        """Retrieve the nodes for a standalone question."""
+        with metrics.timed("chat", "retrieve"):
+            return self.query_engine.retrieve(QueryBundle(question, embedding=embedding))
+
+    def prepare(self, message):
+        """Condense a message, then answer it from the cache or retrieve its nodes."""
+        self.refresh()
+        question = self.condense(message)
+        if self.answer_cache is None:
+            return PreparedTurn(question, nodes=self.retrieve(question))
+
+        cache_version = self.answer_cache.version
+        embedding = Settings.embed_model.get_query_embedding(question)
+        with metrics.timed("chat", "cache_lookup"):
+            cached_answer = self.answer_cache.lookup(embedding)
+        if cached_answer is not None:
+            return PreparedTurn(question, embedding, cached_answer=cached_answer, cache_version=cache_version)
+        return PreparedTurn(question, embedding, nodes=self.retrieve(question, embedding),
+                            cache_version=cache_version)
+
+    def remember(self, prepared, answer):
+        """Store a rail-checked answer in the semantic cache."""
+        if self.answer_cache is not None and prepared.embedding is not None:
+            self.answer_cache.store(prepared.question, prepared.embedding, answer, prepared.cache_version)
+
+    def synthesize(self, question, nodes):
+        """Start synthesizing an answer and return its token generator."""
+        return self.query_engine.synthesize(QueryBundle(question), nodes).response_gen
+
+    def record(self, message, answer):
+        """Add a completed exchange to the history used for condensing."""
+        self.memory.add(MessageRole.USER, message)
+        self.memory.add(MessageRole.ASSISTANT, answer)
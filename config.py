@@ -13,3 +13,117 @@ LLM_CONFIG = {
     "graph_model_api": os.getenv("GRAPH_MODEL_API", "https://ai.api.nvidia.com/v1/vlm/google/deplot"),
     "image_model_api": os.getenv("IMAGE_MODEL_API", "https://ai.api.nvidia.com/v1/vlm/nvidia/neva-22b")
 }
+
+# Configuration for the on-disk cache of image/graph model responses
+CACHE_CONFIG = {
+    "path": os.getenv("MODEL_CACHE_PATH", "vectorstore/model_cache.db"),
+    "max_bytes": int(os.getenv("MODEL_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+}
+
+# Configuration for HTTP calls to the image and graph model endpoints
+HTTP_CONFIG = {
+    "max_concurrency": int(os.getenv("MODEL_MAX_CONCURRENCY", 8)),
+    "timeout": float(os.getenv("MODEL_TIMEOUT", 120)),
+    "max_retries": int(os.getenv("MODEL_MAX_RETRIES", 3)),
+    "backoff_factor": float(os.getenv("MODEL_BACKOFF_FACTOR", 1.0))
+}
+
+# Configuration for document ingestion
+INGEST_CONFIG = {
+    "pdf_workers": int(os.getenv("PDF_WORKERS", os.cpu_count() or 1)),
+    "pdf_parallel_min_pages": int(os.getenv("PDF_PARALLEL_MIN_PAGES", 16)),
+    "pdf_pages_per_task": int(os.getenv("PDF_PAGES_PER_TASK", 4)),
+    "max_concurrent_jobs": int(os.getenv("INGEST_MAX_CONCURRENT_JOBS", 1)),
+    "max_job_history": int(os.getenv("INGEST_MAX_JOB_HISTORY", 100)),
+    "upload_dir": os.getenv("INGEST_UPLOAD_DIR", "vectorstore/uploads"),
+    "artifact_dir": os.getenv("ARTIFACT_DIR", "vectorstore/artifacts"),
+    "office_binary": os.getenv("LIBREOFFICE_BINARY", "libreoffice"),
+    "office_output_dir": os.getenv("OFFICE_OUTPUT_DIR", "vectorstore/ppt_references"),
+    "office_timeout": float(os.getenv("OFFICE_CONVERT_TIMEOUT", 120)),
+    "office_batch_size": int(os.getenv("OFFICE_BATCH_SIZE", 16))
+}
+
+# Configuration for the Chroma vector index
+INDEX_CONFIG = {
+    "chroma_path": os.getenv("CHROMA_PATH", "./chroma_db"),
+    "collection": os.getenv("CHROMA_COLLECTION", "quickstart"),
+    "manifest_path": os.getenv("INGEST_MANIFEST_PATH", "vectorstore/ingest_manifest.json"),
+    "document_batch_size": int(os.getenv("INDEX_DOCUMENT_BATCH_SIZE", 64)),
+    "write_batch_size": int(os.getenv("INDEX_WRITE_BATCH_SIZE", 256)),
+    "gc_grace_seconds": float(os.getenv("INDEX_GC_GRACE_SECONDS", 60))
+}
+
+# Configuration for the chat websocket
+CHAT_CONFIG = {
+    "stream": os.getenv("CHAT_STREAM", "false").lower() == "true",
+    "stream_check_chars": int(os.getenv("CHAT_STREAM_CHECK_CHARS", 400)),
+    "overlap_input_rail": os.getenv("CHAT_OVERLAP_INPUT_RAIL", "true").lower() == "true",
+    "max_workers": int(os.getenv("CHAT_MAX_WORKERS", 64)),
+    "max_inflight_llm": int(os.getenv("CHAT_MAX_INFLIGHT_LLM", 16)),
+    "max_active_turns": int(os.getenv("CHAT_MAX_ACTIVE_TURNS", 256)),
+    "memory_tokens": int(os.getenv("CHAT_MEMORY_TOKENS", 1500)),
+    "summary_tokens": int(os.getenv("CHAT_SUMMARY_TOKENS", 256)),
+    "busy_message": os.getenv("CHAT_BUSY_MESSAGE", "The assistant is busy right now, please try again in a moment.")
+}
+
+# Configuration for the guardrails
+RAILS_CONFIG = {
+    "config_path": os.getenv("RAILS_CONFIG_PATH", "config"),
+    "blocked_terms_path": os.getenv("BLOCKED_TERMS_PATH", "config/rails/blocked_terms.txt"),
+    "blocked_terms_message": "I cannot talk about proprietary technology."
+}
+
+# Configuration for the semantic answer cache
+SEMANTIC_CACHE_CONFIG = {
+    "enabled": os.getenv("SEMANTIC_CACHE", "true").lower() == "true",
+    "threshold": float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.95)),
+    "ttl": float(os.getenv("SEMANTIC_CACHE_TTL", 3600)),
+    "max_entries": int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", 1000))
+}
+
+# Configuration for the batched, cached embedding layer
+EMBED_CONFIG = {
+    "batch_size": int(os.getenv("EMBED_BATCH_SIZE", 32)),
+    "max_concurrency": int(os.getenv("EMBED_MAX_CONCURRENCY", 4)),
+    "cache_path": os.getenv("EMBED_CACHE_PATH", "vectorstore/embedding_cache.db"),
+    "cache_max_bytes": int(os.getenv("EMBED_CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+}
+
+# Configuration for the local image triage that runs before any remote model call
+TRIAGE_CONFIG = {
+    "enabled": os.getenv("IMAGE_TRIAGE", "true").lower() == "true",
+    "min_side": int(os.getenv("TRIAGE_MIN_SIDE", 64)),
+    "decorative_repeats": int(os.getenv("TRIAGE_DECORATIVE_REPEATS", 2)),
+    "max_tracked_hashes": int(os.getenv("TRIAGE_MAX_TRACKED_HASHES", 10000)),
+    "chart_min_white_fraction": float(os.getenv("TRIAGE_CHART_MIN_WHITE_FRACTION", 0.5)),
+    "chart_max_colors": int(os.getenv("TRIAGE_CHART_MAX_COLORS", 160)),
+    "photo_max_white_fraction": float(os.getenv("TRIAGE_PHOTO_MAX_WHITE_FRACTION", 0.15)),
+    "photo_min_colors": int(os.getenv("TRIAGE_PHOTO_MIN_COLORS", 256))
+}
+
+# Configuration for hybrid (vector + BM25) retrieval
+RETRIEVAL_CONFIG = {
+    "hybrid": os.getenv("HYBRID_RETRIEVAL", "true").lower() == "true",
+    "similarity_top_k": int(os.getenv("SIMILARITY_TOP_K", 20)),
+    "vector_top_k": int(os.getenv("VECTOR_TOP_K", 20)),
+    "lexical_top_k": int(os.getenv("LEXICAL_TOP_K", 20)),
+    "fused_top_k": int(os.getenv("FUSED_TOP_K", 8)),
+    "rrf_k": int(os.getenv("RRF_K", 60))
+}
+
+# Configuration for the rerank stage between retrieval and synthesis
+RERANK_CONFIG = {
+    "enabled": os.getenv("RERANK", "true").lower() == "true",
+    "model": os.getenv("RERANK_MODEL", "nvidia/nv-rerankqa-mistral-4b-v3"),
+    "candidates": int(os.getenv("RERANK_CANDIDATES", 20)),
+    "top_n": int(os.getenv("RERANK_TOP_N", 4)),
+    "skip_margin": float(os.getenv("RERANK_SKIP_MARGIN", 0.3)),
+    "cache_path": os.getenv("RERANK_CACHE_PATH", "vectorstore/rerank_cache.db"),
+    "cache_max_bytes": int(os.getenv("RERANK_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+}
+
+# Configuration for the stage metrics served on /metrics and the optional per-request traces
+METRICS_CONFIG = {
+    "buckets": [float(b) for b in os.getenv("METRICS_BUCKETS", "0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30,60").split(",")],
+    "log_traces": os.getenv("METRICS_LOG_TRACES", "false").lower() == "true"
+}
@@ -1,69 +1,202 @@
 import os
+import logging
 import fitz  # PyMuPDF for PDF processing
 from pptx import Presentation
-import subprocess
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 from llama_index.core import Document
+from pptx.enum.shapes import MSO_SHAPE_TYPE
 from utils import (
-    describe_image, is_graph, process_graph, extract_text_around_item, 
-    process_text_blocks, save_uploaded_file
+    describe_image, describe_graphs, extract_text_around_item, process_text_blocks, save_uploaded_file
 )
+from layout import PageLayout
+from office import office_converter, page_renderer, PRESENTATION_EXTENSIONS
+from cache import model_cache
+from artifacts import artifact_store
+from triage import image_triage
+from model_client import model_client
+from metrics import metrics, tracing, current_trace
+from config import INGEST_CONFIG, HTTP_CONFIG
 import os
 from typing import Union, List
 from io import BufferedReader
 
-def get_pdf_documents(pdf_file):
+logger = logging.getLogger(__name__)
+
+def get_pdf_documents(pdf_file, progress=None):
     """Process a PDF file and extract text, tables, and images."""
+    return list(iter_pdf_documents(pdf_file, progress))
+
+def iter_pdf_documents(pdf_file, progress=None):
+    """Yield the documents of a PDF file page by page, in page order."""
     try:
-        f = fitz.open(stream=pdf_file.file.read(), filetype="pdf")  # Use .file to access the file stream
+        pdf_bytes = getattr(pdf_file, "file", pdf_file).read()  # Use .file to access the stream of uploaded files
+        f = fitz.open(stream=pdf_bytes, filetype="pdf")
     except Exception as e:
         print(f"Error opening PDF file: {e}")
-        return []
-    
-    all_pdf_documents = []
+        return
+    metrics.inc("bytes_total", len(pdf_bytes), pipeline="ingest", kind="document")
+
+    page_count = len(f)
+    next_page = 0
+    if pdf_extractor.is_parallel(page_count):
+        f.close()
+        try:
+            for end, page_documents in pdf_extractor.iter_pages(pdf_bytes, page_count, progress):
+                yield from page_documents
+                next_page = end
+        except Exception as e:
+            logger.warning(f"Parallel PDF extraction failed, falling back to sequential from page {next_page}: {e}")
+        f = fitz.open(stream=pdf_bytes, filetype="pdf")
+
+    try:
+        yield from iter_pdf_pages(f, range(next_page, page_count), progress)
+    finally:
+        f.close()
+
+def process_pdf_pages(f, page_numbers, progress=None):
+    """Extract text, tables, and images from the given pages of an open PDF."""
+    return list(iter_pdf_pages(f, page_numbers, progress))
+
+def iter_pdf_pages(f, page_numbers, progress=None):
+    """Yield the documents extracted from the given pages of an open PDF."""
     ongoing_tables = {}
+    seen_hashes = image_triage.new_document()
 
-    for i in range(len(f)):
+    for i in page_numbers:
         page = f[i]
-        text_blocks = [block for block in page.get_text("blocks", sort=True)
-                       if block[-1] == 0 and 0.1 < block[1] / page.rect.height < 0.9]
-        
-        grouped_text_blocks = process_text_blocks(text_blocks)
-        table_docs, table_bboxes, ongoing_tables = parse_all_tables(f, page, i, text_blocks, ongoing_tables)
-        all_pdf_documents.extend(table_docs)
+        with metrics.timed("ingest", "page_text", page=i):
+            layout = PageLayout.from_page(page)
+        metrics.inc("pages_total", kind="pdf")
+
+        table_docs, table_bboxes, ongoing_tables = parse_all_tables(f, page, i, layout, ongoing_tables)
+        yield from table_docs
 
-        image_docs = parse_all_images(f, page, i, text_blocks)
-        all_pdf_documents.extend(image_docs)
+        with image_triage.document(seen_hashes):
+            image_docs = parse_all_images(f, page, i, layout)
+        yield from image_docs
 
+        grouped_text_blocks = process_text_blocks(layout, exclude_bboxes=table_bboxes)
         for text_block_ctr, (heading_block, content) in enumerate(grouped_text_blocks, 1):
-            if not any(fitz.Rect(heading_block[:4]).intersects(bbox) for bbox in table_bboxes):
-                text_doc = create_text_document(f, i, text_block_ctr, heading_block, content)
-                all_pdf_documents.append(text_doc)
+            yield create_text_document(f, i, text_block_ctr, heading_block, content)
+
+        if progress:
+            progress(i + 1, len(f))
+
+_worker_pdf = (None, None)
+
+def _init_pdf_worker(max_concurrency):
+    """Give the worker process its share of the remote model concurrency."""
+    model_client.max_concurrency = max_concurrency
+
+def _process_pdf_page_range(pdf_path, start, end, trace=False):
+    """Worker task: extract documents for pages [start, end) of a PDF, kept open for the next task.
+
+    Returns the documents with the metrics recorded by the task and, if trace is set, its spans.
+    """
+    global _worker_pdf
+    if _worker_pdf[0] != pdf_path:
+        if _worker_pdf[1] is not None:
+            _worker_pdf[1].close()
+        _worker_pdf = (pdf_path, fitz.open(pdf_path))
+    with tracing(trace) as task_trace:
+        documents = process_pdf_pages(_worker_pdf[1], range(start, end))
+        artifact_store.flush()
+    return documents, metrics.collect(), task_trace.spans if task_trace else None
+
+class PdfExtractor:
+    """Extracts the pages of large PDFs in a long-lived process pool.
 
-    f.close()
-    return all_pdf_documents
+    Like PageRenderer's, the pool is started on first use and kept for later documents. It has at
+    most max_concurrency workers, and each one gets an equal share of it for its image and graph
+    model calls, so the pool as a whole stays within the model client's limit.
+    """
+
+    def __init__(self, workers, max_concurrency, min_pages, pages_per_task):
+        self.workers = max(1, min(workers, max_concurrency))
+        self.worker_concurrency = max(1, max_concurrency // self.workers)
+        self.min_pages = min_pages
+        self.pages_per_task = pages_per_task
+        self._lock = threading.Lock()
+        self._pool, self._pid = None, None
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"),
+                                                 initializer=_init_pdf_worker, initargs=(self.worker_concurrency,))
+                self._pid = os.getpid()
+        return self._pool
+
+    def is_parallel(self, page_count):
+        """Check whether a PDF with this many pages is extracted by the pool."""
+        return self.workers > 1 and page_count >= self.min_pages
+
+    def iter_pages(self, pdf_bytes, page_count, progress=None):
+        """Extract page ranges in the pool, yielding (range end, documents) in page order."""
+        page_ranges = [(start, min(start + self.pages_per_task, page_count))
+                       for start in range(0, page_count, self.pages_per_task)]
+        # Workers open the PDF from a file rather than receiving its bytes with every task.
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+            f.write(pdf_bytes)
+        trace = current_trace()
+        futures = []
+        try:
+            pool = self._get_pool()
+            futures = [pool.submit(_process_pdf_page_range, f.name, start, end, trace is not None)
+                       for start, end in page_ranges]
+            for (start, end), future in zip(page_ranges, futures):
+                page_documents, worker_metrics, spans = future.result()
+                metrics.merge(worker_metrics)
+                if spans:
+                    trace.extend(spans)
+                if progress:
+                    progress(end, page_count)
+                yield end, page_documents
+        except BrokenProcessPool:
+            with self._lock:
+                self._pid = None  # a worker died; the next document starts a fresh pool
+            raise
+        finally:
+            for future in futures:
+                future.cancel()
+            wait(futures)
+            os.remove(f.name)
+
+pdf_extractor = PdfExtractor(INGEST_CONFIG["pdf_workers"], HTTP_CONFIG["max_concurrency"],
+                             INGEST_CONFIG["pdf_parallel_min_pages"], INGEST_CONFIG["pdf_pages_per_task"])
 
 def create_text_document(pdf_file, page_num, text_block_ctr, heading_block, content):
     """Helper to create a text Document with metadata."""
     bbox = {"x1": heading_block[0], "y1": heading_block[1], "x2": heading_block[2], "y2": heading_block[3]}
     return Document(
         text=f"{heading_block[4]}\n{content}",
-        metadata={**bbox, "type": "text", "page_num": page_num, "source": f"{pdf_file.name[:-4]}-page{page_num}-block{text_block_ctr}"},
-        id_=f"{pdf_file.name[:-4]}-page{page_num}-block{text_block_ctr}"
+        metadata={**bbox, "type": "text", "page_num": page_num, "source": f"{(pdf_file.name or '')[:-4]}-page{page_num}-block{text_block_ctr}"},
+        id_=f"{(pdf_file.name or '')[:-4]}-page{page_num}-block{text_block_ctr}"
     )
 
-def parse_all_tables(doc, page, page_num, text_blocks, ongoing_tables):
+def parse_all_tables(doc, page, page_num, layout, ongoing_tables):
     """Extract tables from a PDF page."""
     table_docs, table_bboxes = [], []
     try:
-        for tab in page.find_tables(horizontal_strategy="lines_strict", vertical_strategy="lines_strict"):
+        with metrics.timed("ingest", "find_tables", page=page_num):
+            tables = list(page.find_tables(horizontal_strategy="lines_strict", vertical_strategy="lines_strict"))
+        with metrics.timed("ingest", "render_pixmap", page=page_num):
+            table_images = [page.get_pixmap(clip=tab.bbox).tobytes() for tab in tables]
+        graph_descriptions = describe_graphs(table_images, check_graph=False)
+        for tab, table_image, graph_description in zip(tables, table_images, graph_descriptions):
             pandas_df = tab.to_pandas()
-            table_path = save_table_to_file(pandas_df, page_num, len(table_docs) + 1)
-            before_text, after_text = extract_text_around_item(text_blocks, fitz.Rect(tab.bbox), page.rect.height)
-            caption = before_text.replace("\n", " ") + process_graph(page.get_pixmap(clip=tab.bbox).tobytes()) + after_text.replace("\n", " ")
+            table_path = save_table_to_file(pandas_df)
+            before_text, after_text = extract_text_around_item(layout, fitz.Rect(tab.bbox), page.rect.height)
+            caption = before_text.replace("\n", " ") + graph_description + after_text.replace("\n", " ")
             doc_metadata = {
-                "source": f"{doc.name[:-4]}-page{page_num}-table{len(table_docs) + 1}",
+                "source": f"{(doc.name or '')[:-4]}-page{page_num}-table{len(table_docs) + 1}",
                 "dataframe": table_path,
-                "image": save_image(page.get_pixmap(clip=tab.bbox), page_num, len(table_docs) + 1),
+                "image": save_image_data(table_image),
                 "caption": caption,
                 "type": "table",
                 "page_num": page_num
@@ -74,84 +207,96 @@ def parse_all_tables(doc, page, page_num, text_blocks, ongoing_tables):
         print(f"Error extracting tables: {e}")
     return table_docs, table_bboxes, ongoing_tables
 
-def parse_all_images(doc, page, page_num, text_blocks):
+def parse_all_images(doc, page, page_num, layout):
     """Extract images from a PDF page."""
-    image_docs = []
+    image_docs, images = [], []
     for image_info in page.get_image_info(xrefs=True):
         xref = image_info['xref']
         img_bbox = fitz.Rect(image_info['bbox'])
         if xref and valid_image_size(img_bbox, page.rect):
-            img_data = page.parent.extract_image(xref)["image"]
-            before_text, after_text = extract_text_around_item(text_blocks, img_bbox, page.rect.height)
-            caption = before_text.replace("\n", " ") + (process_graph(img_data) if is_graph(img_data) else "") + after_text.replace("\n", " ")
-            image_docs.append(Document(
-                text="This is an image with caption: " + caption,
-                metadata={"source": f"{doc.name[:-4]}-page{page_num}-image{xref}", "image": save_image_data(img_data, page_num, xref), "caption": caption, "type": "image", "page_num": page_num}
-            ))
+            extracted = page.parent.extract_image(xref)
+            images.append((xref, img_bbox, extracted["image"], extracted.get("ext", "png")))
+
+    graph_descriptions = describe_graphs([img_data for _, _, img_data, _ in images])
+    for (xref, img_bbox, img_data, img_ext), graph_description in zip(images, graph_descriptions):
+        before_text, after_text = extract_text_around_item(layout, img_bbox, page.rect.height)
+        caption = before_text.replace("\n", " ") + graph_description + after_text.replace("\n", " ")
+        image_docs.append(Document(
+            text="This is an image with caption: " + caption,
+            metadata={"source": f"{(doc.name or '')[:-4]}-page{page_num}-image{xref}", "image": save_image_data(img_data, img_ext), "caption": caption, "type": "image", "page_num": page_num}
+        ))
     return image_docs
 
 def valid_image_size(bbox, page_rect):
     """Check if image size is reasonable."""
     return bbox.width > page_rect.width / 20 and bbox.height > page_rect.height / 20
 
-def save_table_to_file(dataframe, page_num, table_num):
-    """Save table to an Excel file."""
-    table_path = os.path.join("vectorstore/table_references", f"table{table_num}-page{page_num}.xlsx")
-    os.makedirs(os.path.dirname(table_path), exist_ok=True)
-    dataframe.to_excel(table_path)
-    return table_path
-
-def save_image(pixmap, page_num, img_num):
-    """Save image from pixmap."""
-    image_path = os.path.join("vectorstore/image_references", f"image{img_num}-page{page_num}.jpg")
-    os.makedirs(os.path.dirname(image_path), exist_ok=True)
-    pixmap.save(image_path)
-    return image_path
-
-def save_image_data(img_data, page_num, img_num):
-    """Save image data to a file."""
-    image_path = os.path.join("vectorstore/image_references", f"image{img_num}-page{page_num}.png")
-    os.makedirs(os.path.dirname(image_path), exist_ok=True)
-    with open(image_path, "wb") as img_file:
-        img_file.write(img_data)
-    return image_path
+def save_table_to_file(dataframe):
+    """Save table to a content-addressed Excel file."""
+    return artifact_store.put_dataframe(dataframe)
+
+def save_image_data(img_data, extension="png"):
+    """Save image data to a content-addressed file."""
+    return artifact_store.put_bytes("images", img_data, f".{extension}")
 
 def process_ppt_file(ppt_path):
-    """Process a PowerPoint file."""
-    pdf_path = convert_ppt_to_pdf(ppt_path)
-    images_data = convert_pdf_to_images(pdf_path)
-    slide_texts = extract_text_and_notes_from_ppt(ppt_path)
+    """Process a PowerPoint file.
+
+    Slide text is read while LibreOffice converts the deck, and the rendered images of slides
+    with pictures, charts or tables are checked for graphs concurrently.
+    """
+    with ThreadPoolExecutor(max_workers=1) as text_reader:
+        slide_texts = text_reader.submit(extract_text_and_notes_from_ppt, ppt_path)
+        images_data = convert_pdf_to_images(convert_ppt_to_pdf(ppt_path))
+        slide_texts = slide_texts.result()
+    graph_slides = [i for i, (_, _, has_graphic) in enumerate(slide_texts[:len(images_data)]) if has_graphic]
+    with image_triage.document(image_triage.new_document()):
+        graph_descriptions = dict(zip(graph_slides, describe_graphs([images_data[i][2] for i in graph_slides])))
     processed_data = []
-    for (image_path, page_num), (slide_text, notes) in zip(images_data, slide_texts):
+    for (image_path, page_num, _), (slide_text, notes, _) in zip(images_data, slide_texts):
         processed_data.append(Document(
-            text="This is a slide with text: " + slide_text + (process_graph(slide_text.encode()) if is_graph(slide_text.encode()) else ""),
+            text="This is a slide with text: " + slide_text + graph_descriptions.get(page_num, ""),
             metadata={"source": ppt_path, "image": image_path, "caption": slide_text + notes, "type": "image", "page_num": page_num}
         ))
     return processed_data
 
+def prefetch_presentations(paths):
+    """Start converting the presentations among the given paths in the background, in batches."""
+    presentations = [path for path in paths if os.path.splitext(path.lower())[1] in PRESENTATION_EXTENSIONS]
+    if presentations:
+        office_converter.prefetch(presentations)
+
 def convert_ppt_to_pdf(ppt_path):
-    """Convert PPT to PDF with LibreOffice."""
-    pdf_path = os.path.join("vectorstore/ppt_references", f"{os.path.splitext(os.path.basename(ppt_path))[0]}.pdf")
-    os.makedirs(os.path.dirname(pdf_path), exist_ok=True)
-    subprocess.run(['libreoffice', '--headless', '--convert-to', 'pdf', '--outdir', os.path.dirname(pdf_path), ppt_path], check=True)
-    return pdf_path
+    """Convert PPT to PDF with LibreOffice, reusing a prefetched or earlier conversion."""
+    return office_converter.convert(ppt_path)
 
 def convert_pdf_to_images(pdf_path):
-    """Convert PDF to images."""
-    doc = fitz.open(pdf_path)
-    image_paths = [(save_image(fitz.Pixmap(doc.load_page(i).get_pixmap()), i, i), i) for i in range(len(doc))]
-    doc.close()
-    return image_paths
+    """Convert PDF to images, returning (image path, page number, PNG bytes) per page."""
+    images = page_renderer.render(pdf_path)
+    metrics.inc("pages_total", len(images), kind="slide")
+    return [(save_image_data(image), i, image) for i, image in enumerate(images)]
+
+def has_graphic(slide):
+    """Check if a slide has a picture, chart or table that may hold a graph."""
+    return any(shape.shape_type == MSO_SHAPE_TYPE.PICTURE or getattr(shape, "has_chart", False)
+               or getattr(shape, "has_table", False) for shape in slide.shapes)
 
 def extract_text_and_notes_from_ppt(ppt_path):
-    """Extract text and notes from a PowerPoint file."""
+    """Extract text, notes and whether it has a graphic from each slide of a PowerPoint file."""
     prs = Presentation(ppt_path)
-    return [( ' '.join([shape.text for shape in slide.shapes if hasattr(shape, "text")]), slide.notes_slide.notes_text_frame.text if slide.notes_slide else '') for slide in prs.slides]
+    return [( ' '.join([shape.text for shape in slide.shapes if hasattr(shape, "text")]), slide.notes_slide.notes_text_frame.text if slide.notes_slide else '', has_graphic(slide)) for slide in prs.slides]
 
-def load_multimodal_data(files: Union[List[str], List[BufferedReader]]):
-    """Load and process multiple file types (file paths or file objects)."""
-    documents = []
-    
+def load_multimodal_data(files: Union[List[str], List[BufferedReader]], progress=None, on_error=None):
+    """Load and process multiple file types (file paths or file objects).
+
+    progress, if given, is called with (pages_done, pages_total) while PDFs are processed.
+    on_error, if given, is called with (file, exception) for every file that fails.
+    """
+    return list(iter_multimodal_data(files, progress, on_error))
+
+def iter_multimodal_data(files: Union[List[str], List[BufferedReader]], progress=None, on_error=None):
+    """Yield the documents of multiple files one at a time; see load_multimodal_data."""
+    prefetch_presentations([file for file in files if isinstance(file, str)])
     for file in files:
         try:
             # Check if the file is a path (str) or a file object (BufferedReader)
@@ -160,33 +305,40 @@ def load_multimodal_data(files: Union[List[str], List[BufferedReader]]):
                 with open(file, "rb") as f:
                     file_extension = os.path.splitext(file.lower())[1]
                     if file_extension in ('.png', '.jpg', '.jpeg'):
-                        documents.append(Document(text=describe_image(f.read()), metadata={"source": file, "type": "image"}))
+                        yield Document(text=describe_image(f.read()), metadata={"source": file, "type": "image"})
                     elif file_extension == '.pdf':
-                        documents.extend(get_pdf_documents(f))
+                        yield from iter_pdf_documents(f, progress=progress)
                     elif file_extension in ('.ppt', '.pptx'):
-                        documents.extend(process_ppt_file(f))
+                        yield from process_ppt_file(file)
                     else:
-                        documents.append(Document(text=f.read().decode("utf-8"), metadata={"source": file, "type": "text"}))
+                        yield Document(text=f.read().decode("utf-8"), metadata={"source": file, "type": "text"})
             else:  # File object (e.g., from upload)
                 file_extension = os.path.splitext(file.filename.lower())[1]
                 if file_extension in ('.png', '.jpg', '.jpeg'):
-                    documents.append(Document(text=describe_image(file.file.read()), metadata={"source": file.filename, "type": "image"}))
+                    yield Document(text=describe_image(file.file.read()), metadata={"source": file.filename, "type": "image"})
                 elif file_extension == '.pdf':
-                    documents.extend(get_pdf_documents(file))
+                    yield from iter_pdf_documents(file, progress=progress)
                 elif file_extension in ('.ppt', '.pptx'):
-                    documents.extend(process_ppt_file(save_uploaded_file(file)))
+                    yield from process_ppt_file(save_uploaded_file(file))
                 else:
-                    documents.append(Document(text=file.file.read().decode("utf-8"), metadata={"source": file.filename, "type": "text"}))
+                    yield Document(text=file.file.read().decode("utf-8"), metadata={"source": file.filename, "type": "text"})
         except Exception as e:
             print(f"Error processing {file}: {e}")
-    
-    return documents
+            if on_error:
+                on_error(file, e)
+        finally:
+            artifact_store.flush()
+
+    logger.debug(f"Model cache stats: {model_cache.stats()}, artifacts: {artifact_store.stats()}")
 
 def load_data_from_directory(directory):
     """Load all files from a directory."""
-    documents = []
-    for filename in os.listdir(directory):
-        file_path = os.path.join(directory, filename)
-        with open(file_path, 'rb') as file:
-            documents.extend(load_multimodal_data([file_path]))
-    return documents
+    return list(iter_directory_documents(directory))
+
+def iter_directory_documents(directory):
+    """Yield the documents of every file in a directory, one file at a time."""
+    file_paths = [os.path.join(directory, filename) for filename in sorted(os.listdir(directory))
+                  if os.path.isfile(os.path.join(directory, filename))]
+    prefetch_presentations(file_paths)
+    for file_path in file_paths:
+        yield from iter_multimodal_data([file_path])
@@ -0,0 +1,105 @@
+import base64
+import asyncio
+import contextvars
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+from cache import ModelCache, LazyModel, Counters
+from metrics import metrics, estimate_tokens
+
+def _encode_vector(vector):
+    return base64.b64encode(array("f", vector).tobytes()).decode("ascii")
+
+def _decode_vector(value):
+    vector = array("f")
+    vector.frombytes(base64.b64decode(value))
+    return vector.tolist()
+
+class CachedEmbedding(BaseEmbedding):
+    """Wraps an embedding model with a text-hash cache and concurrent, fixed-size batches.
+
+    Vectors are cached by (model, text, query/text mode), so sentence windows embedded by the
+    semantic splitter and repeated chunks are only ever requested once. inner may also be a
+    factory (see LazyModel), in which case model_name is required.
+    """
+
+    _inner: LazyModel = PrivateAttr()
+    _cache: ModelCache = PrivateAttr()
+    _batch_size: int = PrivateAttr()
+    _executor: ThreadPoolExecutor = PrivateAttr()
+    _stats: Counters = PrivateAttr()
+
+    def __init__(self, inner, cache, batch_size, max_concurrency, model_name=None, **kwargs):
+        # The base class hands us embed_batch_size texts at a time; we split them into
+        # batch_size requests and run up to max_concurrency of them in parallel.
+        super().__init__(model_name=model_name or inner.model_name, embed_batch_size=batch_size * max_concurrency,
+                         **kwargs)
+        self._inner = LazyModel(inner, BaseEmbedding)
+        self._cache = cache
+        self._batch_size = batch_size
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="embed")
+        self._stats = Counters("requests", "texts_embedded", "cache_hits", "estimated_tokens")
+
+    @classmethod
+    def class_name(cls):
+        return "CachedEmbedding"
+
+    def stats(self):
+        """Return a copy of the embedding request counters."""
+        return self._stats.snapshot()
+
+    @staticmethod
+    def stats_delta(before, after):
+        """Return the counters accumulated between two stats() snapshots."""
+        return {key: after[key] - before.get(key, 0) for key in after}
+
+    def _request(self, texts, mode):
+        pipeline = "chat" if mode == "query" else "ingest"
+        requests = 1 if mode == "text" else len(texts)
+        tokens = sum(estimate_tokens(text) for text in texts)
+        with metrics.timed(pipeline, "embed", texts=len(texts)):
+            if mode == "query":
+                vectors = [self._inner.get().get_query_embedding(text) for text in texts]
+            else:
+                vectors = self._inner.get()._get_text_embeddings(texts)
+        metrics.inc("remote_calls_total", requests, service="embedding", stage="embed")
+        metrics.inc("tokens_total", tokens, pipeline=pipeline, stage="embed", direction="prompt")
+        self._stats.add(requests=requests, texts_embedded=len(texts), estimated_tokens=tokens)
+        return vectors
+
+    def _embed(self, texts, mode):
+        keys = [ModelCache.make_key(text.encode("utf-8"), self.model_name, mode) for text in texts]
+        vectors = {key: _decode_vector(value) for key, value in self._cache.get_many(list(set(keys))).items()}
+        self._stats.add(cache_hits=sum(1 for key in keys if key in vectors))
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+        if missing:
+            missing_keys, missing_texts = list(missing), list(missing.values())
+            batches = [missing_texts[i:i + self._batch_size] for i in range(0, len(missing_texts), self._batch_size)]
+            contexts = [contextvars.copy_context() for _ in batches]
+            new_vectors = [vector for batch in self._executor.map(
+                               lambda context, batch: context.run(self._request, batch, mode), contexts, batches)
+                           for vector in batch]
+            fresh = dict(zip(missing_keys, new_vectors))
+            self._cache.set_many({key: _encode_vector(vector) for key, vector in fresh.items()})
+            vectors.update(fresh)
+        return [vectors[key] for key in keys]
+
+    def _get_query_embedding(self, query):
+        return self._embed([query], "query")[0]
+
+    async def _aget_query_embedding(self, query):
+        return await asyncio.to_thread(self._get_query_embedding, query)
+
+    def _get_text_embedding(self, text):
+        return self._embed([text], "text")[0]
+
+    def _get_text_embeddings(self, texts):
+        return self._embed(texts, "text")
+
+    async def _aget_text_embeddings(self, texts):
+        return await asyncio.to_thread(self._get_text_embeddings, texts)
@@ -0,0 +1,468 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from itertools import islice
+from llama_index.core import Settings, VectorStoreIndex
+from llama_index.core.indices.utils import embed_nodes
+from llama_index.core.schema import MetadataMode
+from llama_index.core.vector_stores import FilterOperator, MetadataFilter, MetadataFilters
+from llama_index.vector_stores.chroma import ChromaVectorStore
+from lexical import BM25Index
+from metrics import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process manifest lock, run a single worker
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Chroma metadata fields holding the index versions that added and removed each node.
+VERSION_KEY, REMOVED_KEY = "index_version", "removed_version"
+# Version of nodes that are not committed yet, and removal version of nodes that are still live.
+UNSET_VERSION = 2 ** 31 - 1
+
+def hash_bytes(content):
+    """Return the sha256 hex digest of some bytes."""
+    return hashlib.sha256(content).hexdigest()
+
+class IngestManifest:
+    """Per-source record of the content hash and the node ids each source produced, plus the committed index version.
+
+    Node ids written by an ingest that has not finished are appended to a checkpoint log per
+    source in <path>.checkpoints, so checkpointing a batch does not rewrite the whole manifest.
+    A source's log is deleted once the manifest recording its commit or removal is saved.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.checkpoint_dir = f"{path}.checkpoints"
+        self.sources = {}
+        self.version, self.versioned = 0, False
+        self.mtime = None
+        self._finished = set()
+        self.load()
+
+    def load(self):
+        """Read the manifest from disk, if it exists."""
+        self._finished = set()
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.sources = data.get("sources", {})
+            self.version, self.versioned = data.get("version", 0), "version" in data
+            self.mtime = os.stat(self.path).st_mtime_ns
+
+    def changed_on_disk(self):
+        """Check whether another process saved the manifest since it was last read or written here."""
+        try:
+            return os.stat(self.path).st_mtime_ns != self.mtime
+        except FileNotFoundError:
+            return False
+
+    @contextmanager
+    def transaction(self):
+        """Reload the manifest under a cross-process lock and save it if the block succeeds."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(f"{self.path}.lock", "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self.load()
+                yield self
+                self.save()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def is_unchanged(self, source, content_hash):
+        """Check whether a source was already indexed with this content hash."""
+        return self.sources.get(source, {}).get("hash") == content_hash
+
+    def node_ids(self, source):
+        """Return every node id a source has in the collection, including checkpointed ones."""
+        return self.sources.get(source, {}).get("node_ids", []) + self.checkpoint_ids(source)
+
+    def _checkpoint_path(self, source):
+        return os.path.join(self.checkpoint_dir, f"{hash_bytes(source.encode('utf-8'))}.ids")
+
+    def checkpoint_ids(self, source):
+        """Return the node ids written by an unfinished ingest of a source."""
+        try:
+            with open(self._checkpoint_path(source), "r", encoding="utf-8") as f:
+                written = f.read().split()
+        except FileNotFoundError:
+            return []
+        # A log left behind by a crash right after its commit only holds committed ids.
+        committed = set(self.sources.get(source, {}).get("node_ids", []))
+        return [node_id for node_id in dict.fromkeys(written) if node_id not in committed]
+
+    def all_checkpoint_ids(self):
+        """Return the node ids written by every unfinished ingest."""
+        committed = {node_id for entry in self.sources.values() for node_id in entry["node_ids"]}
+        written = set()
+        for name in os.listdir(self.checkpoint_dir) if os.path.isdir(self.checkpoint_dir) else []:
+            with open(os.path.join(self.checkpoint_dir, name), "r", encoding="utf-8") as f:
+                written.update(f.read().split())
+        return written - committed
+
+    def is_indexed(self, source):
+        """Check whether a source finished indexing at least once."""
+        return self.sources.get(source, {}).get("hash") is not None
+
+    def checkpoint(self, source, node_ids):
+        """Append node ids written by an ingest of the source that has not finished yet to its log."""
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        with open(self._checkpoint_path(source), "a", encoding="utf-8") as f:
+            f.write("".join(f"{node_id}\n" for node_id in node_ids))
+
+    def update(self, source, content_hash, node_ids):
+        """Record the hash and node ids produced by a finished ingest of a source."""
+        self.sources[source] = {"hash": content_hash, "node_ids": list(node_ids)}
+        self._finished.add(self._checkpoint_path(source))
+
+    def remove(self, source):
+        """Forget a source and return the node ids it had produced."""
+        node_ids = self.node_ids(source)
+        self.sources.pop(source, None)
+        self._finished.add(self._checkpoint_path(source))
+        return node_ids
+
+    def clear(self):
+        """Forget every source."""
+        self.sources = {}
+        if os.path.isdir(self.checkpoint_dir):
+            self._finished.update(os.path.join(self.checkpoint_dir, name) for name in os.listdir(self.checkpoint_dir))
+
+    def save(self):
+        """Write the manifest to disk atomically, then delete the checkpoint logs it supersedes."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.version, "sources": self.sources}, f)
+        os.replace(tmp_path, self.path)
+        self.mtime = os.stat(self.path).st_mtime_ns
+        for path in self._finished:
+            if os.path.exists(path):
+                os.remove(path)
+        self._finished = set()
+
+def build_nodes(source, documents, seen=None):
+    """Split documents into nodes whose ids depend only on their source and content.
+
+    seen counts ids already issued for the source, so repeated chunks get distinct ids when a
+    source is split in several calls.
+    """
+    for document in documents:
+        document.metadata["file_source"] = source
+        document.excluded_embed_metadata_keys.append("file_source")
+        document.excluded_llm_metadata_keys.append("file_source")
+
+    with metrics.timed("ingest", "split", documents=len(documents)):
+        nodes = Settings.node_parser.get_nodes_from_documents(documents)
+    seen = Counter() if seen is None else seen
+    for node in nodes:
+        base_id = hash_bytes(f"{source}\0{node.get_content(metadata_mode=MetadataMode.NONE)}".encode("utf-8"))
+        seen[base_id] += 1
+        node.id_ = base_id if seen[base_id] == 1 else f"{base_id}-{seen[base_id]}"
+    return nodes
+
+def _batched(iterable, size):
+    """Yield lists of up to size items from an iterable."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+class IndexSnapshot:
+    """A committed index version pinned by a reader until release() is called."""
+
+    def __init__(self, manager, version):
+        self.manager = manager
+        self.version = version
+        self._released = False
+
+    def filters(self):
+        """Metadata filters that limit vector retrieval to the nodes of this version."""
+        return MetadataFilters(filters=[
+            MetadataFilter(key=VERSION_KEY, value=self.version, operator=FilterOperator.LTE),
+            MetadataFilter(key=REMOVED_KEY, value=self.version, operator=FilterOperator.GT),
+        ])
+
+    def retriever(self, similarity_top_k):
+        """Return a vector retriever over this version."""
+        return self.manager.index.as_retriever(similarity_top_k=similarity_top_k, filters=self.filters())
+
+    def release(self):
+        """Unpin the version so its removed nodes can be garbage-collected."""
+        if not self._released:
+            self._released = True
+            self.manager.release(self)
+
+class IndexManager:
+    """Keeps a Chroma collection, and the BM25 index built alongside it, in sync with the ingested sources.
+
+    Every ingest or removal publishes a new index version. Nodes carry the version that added
+    them and the version that removed them, so readers pinned to a snapshot never see a
+    half-written source. New nodes stay invisible until their ingest commits, and removed nodes
+    are only deleted once no reader still uses a version that contains them and at least
+    gc_grace_seconds have passed.
+
+    Several processes (e.g. uvicorn workers) can share the same Chroma path and manifest: the
+    manifest is only changed under a file lock, its committed version is the marker every
+    process catches up to in sync(), and the grace period covers readers in other processes.
+    """
+
+    def __init__(self, chroma_client, collection_name, manifest_path, document_batch_size=64, write_batch_size=256,
+                 gc_grace_seconds=60):
+        self.chroma_client = chroma_client
+        self.document_batch_size = document_batch_size
+        self.write_batch_size = write_batch_size
+        self.gc_grace_seconds = gc_grace_seconds
+        self.collection_name = collection_name
+        self.manifest = IngestManifest(manifest_path)
+        self.collection = chroma_client.get_or_create_collection(collection_name)
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._readers = Counter()
+        self._garbage = {}
+        with self.manifest.transaction():
+            if self.collection.count() == 0 and self.manifest.sources:
+                logger.info("Chroma collection is empty, discarding stale ingest manifest.")
+                self.manifest.clear()
+            self.version = self.manifest.version
+            if not self.manifest.versioned:
+                self._migrate()
+            self._recover()
+        self.index = VectorStoreIndex.from_vector_store(ChromaVectorStore(chroma_collection=self.collection))
+        self.lexical_index = BM25Index.from_collection(self.collection, VERSION_KEY, REMOVED_KEY)
+        logger.info(f"Attached to collection {collection_name} at index version {self.version}, "
+                    f"{self.collection.count()} nodes.")
+
+    def _set_metadata(self, node_ids, metadata):
+        """Merge the same metadata fields into every given node."""
+        for batch in _batched(node_ids, self.write_batch_size):
+            self.collection.update(ids=batch, metadatas=[dict(metadata) for _ in batch])
+
+    def _migrate(self):
+        """Mark nodes written before index versions existed as part of every version."""
+        offset, legacy_ids = 0, []
+        while True:
+            page = self.collection.get(include=["metadatas"], limit=1000, offset=offset)
+            if not page["ids"]:
+                break
+            legacy_ids += [node_id for node_id, metadata in zip(page["ids"], page["metadatas"])
+                           if VERSION_KEY not in (metadata or {})]
+            offset += len(page["ids"])
+        self._set_metadata(legacy_ids, {VERSION_KEY: 0, REMOVED_KEY: UNSET_VERSION})
+        self.manifest.versioned = True
+
+    def _recover(self):
+        """Undo tags of a commit that never reached the manifest and schedule removed nodes for deletion."""
+        unfinished = self.collection.get(where={"$and": [{VERSION_KEY: {"$gt": self.version}},
+                                                         {VERSION_KEY: {"$ne": UNSET_VERSION}}]}, include=[])
+        self._set_metadata(unfinished["ids"], {VERSION_KEY: UNSET_VERSION})
+        unremoved = self.collection.get(where={"$and": [{REMOVED_KEY: {"$gt": self.version}},
+                                                        {REMOVED_KEY: {"$ne": UNSET_VERSION}}]}, include=[])
+        self._set_metadata(unremoved["ids"], {REMOVED_KEY: UNSET_VERSION})
+        removed = self.collection.get(where={REMOVED_KEY: {"$lte": self.version}}, include=[])
+        # Removed nodes an unfinished ingest already reused must survive until it commits.
+        self._retire(self.version, set(removed["ids"]).difference(self.manifest.all_checkpoint_ids()))
+
+    def _retire(self, version, node_ids):
+        """Schedule nodes removed in a version for deletion."""
+        if node_ids:
+            retired_at, retired_ids = self._garbage.setdefault(version, (time.time(), set()))
+            retired_ids.update(node_ids)
+
+    def _catch_up(self):
+        """Apply versions up to manifest.version committed by other processes; call with the lock held."""
+        version = self.manifest.version
+        if version <= self.version:
+            return False
+
+        def window(key):
+            return {"$and": [{key: {"$gt": self.version}}, {key: {"$lte": version}}]}
+        added = self.collection.get(where=window(VERSION_KEY), include=["documents", "metadatas"])
+        for node_id, document, metadata in zip(added["ids"], added["documents"], added["metadatas"]):
+            self.lexical_index.add([(node_id, document or "")], added=metadata[VERSION_KEY],
+                                   removed=metadata[REMOVED_KEY])
+        removed = self.collection.get(where=window(REMOVED_KEY), include=["metadatas"])
+        for node_id, metadata in zip(removed["ids"], removed["metadatas"]):
+            self.lexical_index.set_visibility([node_id], removed=metadata[REMOVED_KEY])
+            self._retire(metadata[REMOVED_KEY], [node_id])
+        logger.info(f"Caught up from index version {self.version} to {version}.")
+        self.version = version
+        return True
+
+    def sync(self):
+        """Catch up with versions committed by other processes sharing the manifest."""
+        if not self.manifest.changed_on_disk():
+            return
+        with self._lock:
+            self.manifest.load()
+            changed = self._catch_up()
+        if changed:
+            self._notify()
+
+    def is_empty(self):
+        """Check whether the latest committed version has no nodes."""
+        self.sync()
+        return not self.collection.get(where={"$and": [{VERSION_KEY: {"$lte": self.version}},
+                                                       {REMOVED_KEY: {"$gt": self.version}}]},
+                                       limit=1, include=[])["ids"]
+
+    def on_change(self, listener):
+        """Register a callable to run whenever indexed content changes."""
+        self._listeners.append(listener)
+
+    def _notify(self):
+        for listener in self._listeners:
+            listener()
+
+    def acquire(self):
+        """Pin the latest committed version and return its snapshot."""
+        self.sync()
+        with self._lock:
+            self._readers[self.version] += 1
+            return IndexSnapshot(self, self.version)
+
+    def release(self, snapshot):
+        """Unpin a snapshot returned by acquire()."""
+        with self._lock:
+            self._readers[snapshot.version] -= 1
+            if self._readers[snapshot.version] <= 0:
+                del self._readers[snapshot.version]
+            self._collect_garbage()
+
+    def _collect_garbage(self):
+        """Delete nodes removed in a version no reader can still see; call with the lock held."""
+        oldest = min([self.version, *self._readers])
+        deadline = time.time() - self.gc_grace_seconds
+        collectable = [version for version, (retired_at, _) in self._garbage.items()
+                       if version <= oldest and retired_at <= deadline]
+        node_ids = [node_id for version in collectable for node_id in self._garbage.pop(version)[1]]
+        if node_ids:
+            self.collection.delete(ids=node_ids)
+            self.lexical_index.remove(node_ids)
+            logger.info(f"Garbage-collected {len(node_ids)} nodes up to index version {oldest}.")
+
+    def _commit(self, added_ids, removed_ids):
+        """Publish a version that adds and removes the given nodes; call with the lock held."""
+        version = self.version + 1
+        if added_ids:
+            self._set_metadata(list(added_ids), {VERSION_KEY: version, REMOVED_KEY: UNSET_VERSION})
+            self.lexical_index.set_visibility(added_ids, added=version, removed=UNSET_VERSION)
+            for _, node_ids in self._garbage.values():
+                node_ids.difference_update(added_ids)
+        if removed_ids:
+            self._set_metadata(list(removed_ids), {REMOVED_KEY: version})
+            self.lexical_index.set_visibility(removed_ids, removed=version)
+            self._retire(version, removed_ids)
+        self.manifest.version = version
+        self.version = version
+        self._collect_garbage()
+
+    def ingest(self, source, content_hash, load_documents):
+        """Index a source unless it is unchanged; returns "skipped", "added" or "updated".
+
+        load_documents may return any iterable of documents. They are consumed lazily and the
+        new nodes are embedded and written in batches of write_batch_size, with a checkpoint after
+        each batch, so memory stays bounded and an interrupted ingest resumes where it stopped.
+        The new nodes only become visible when the whole source is committed as a new version.
+        """
+        self.sync()
+        if self.manifest.is_unchanged(source, content_hash):
+            return "skipped"
+
+        committed_ids = set(self.manifest.sources.get(source, {}).get("node_ids", []))
+        written_ids = set(self.manifest.checkpoint_ids(source))
+        existing_ids = committed_ids | written_ids
+        new_ids, seen, pending = [], Counter(), []
+        for documents in _batched(load_documents(), self.document_batch_size):
+            for node in build_nodes(source, documents, seen):
+                new_ids.append(node.id_)
+                if node.id_ not in existing_ids:
+                    pending.append(node)
+            while len(pending) >= self.write_batch_size:
+                self._write_batch(source, pending[:self.write_batch_size], written_ids)
+                pending = pending[self.write_batch_size:]
+        if pending:
+            self._write_batch(source, pending, written_ids)
+
+        with self._lock, self.manifest.transaction():
+            self._catch_up()
+            stale_ids = committed_ids.difference(new_ids)
+            abandoned_ids = written_ids.difference(new_ids)
+            if abandoned_ids:
+                self.collection.delete(ids=list(abandoned_ids))
+                self.lexical_index.remove(abandoned_ids)
+            status = "updated" if self.manifest.is_indexed(source) else "added"
+            self.manifest.update(source, content_hash, new_ids)
+            self._commit(written_ids.intersection(new_ids), stale_ids)
+            version = self.version
+        self._notify()
+        logger.info(f"{source}: {status} in index version {version}, {len(new_ids)} nodes, {len(stale_ids)} removed.")
+        return status
+
+    def _write_batch(self, source, nodes, written_ids):
+        """Embed and write one batch of not yet visible nodes, then append their ids to the checkpoint.
+
+        Nodes that are still in the collection because an older version removed them are not
+        written again; the commit makes them visible again. They are taken out of the garbage
+        first, so a reader releasing its version before the commit cannot delete them.
+        """
+        with self._lock:
+            present = set(self.collection.get(ids=[node.id_ for node in nodes], include=[])["ids"])
+            for _, node_ids in self._garbage.values():
+                node_ids.difference_update(present)
+        fresh = [node for node in nodes if node.id_ not in present]
+        for node in fresh:
+            node.metadata[VERSION_KEY] = UNSET_VERSION
+            node.metadata[REMOVED_KEY] = UNSET_VERSION
+            for excluded in (node.excluded_embed_metadata_keys, node.excluded_llm_metadata_keys):
+                excluded.extend(key for key in (VERSION_KEY, REMOVED_KEY) if key not in excluded)
+        # Embed outside the lock, so other writers are not held up and vector_write only times Chroma.
+        if fresh:
+            embeddings = embed_nodes(fresh, Settings.embed_model)
+            for node in fresh:
+                node.embedding = embeddings[node.id_]
+        with self._lock:
+            if fresh:
+                with metrics.timed("ingest", "vector_write", nodes=len(fresh)):
+                    self.index.insert_nodes(fresh)
+                self.lexical_index.add(((node.id_, node.get_content(metadata_mode=MetadataMode.NONE)) for node in fresh),
+                                       added=UNSET_VERSION, removed=UNSET_VERSION)
+            written_ids.update(node.id_ for node in nodes)
+            self.manifest.checkpoint(source, [node.id_ for node in nodes])
+
+    def remove_source(self, source):
+        """Remove every node produced by a source in a new version; returns False for unknown sources."""
+        with self._lock, self.manifest.transaction():
+            self._catch_up()
+            abandoned_ids = set(self.manifest.checkpoint_ids(source))
+            if source not in self.manifest.sources and not abandoned_ids:
+                return False
+            node_ids = self.manifest.sources.get(source, {}).get("node_ids", [])
+            if abandoned_ids:
+                self.collection.delete(ids=list(abandoned_ids))
+                self.lexical_index.remove(abandoned_ids)
+            self.manifest.remove(source)
+            self._commit(set(), set(node_ids))
+        self._notify()
+        logger.info(f"{source}: removed, {len(node_ids)} nodes retired.")
+        return True
+
+    def remove_missing(self, directory):
+        """Remove indexed sources under a directory whose files no longer exist."""
+        self.sync()
+        prefix = os.path.join(directory, "")
+        missing = [source for source in list(self.manifest.sources)
+                   if source.startswith(prefix) and not os.path.exists(source)]
+        for source in missing:
+            self.remove_source(source)
+        return missing
@@ -0,0 +1,88 @@
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+def _new_file_state():
+    return {"stage": "queued", "pages_done": 0, "pages_total": None, "result": None, "error": None}
+
+class IngestJob:
+    """Status of one background ingestion job and of each file it processes."""
+
+    def __init__(self, sources):
+        self.id = uuid.uuid4().hex
+        self.status = "queued"
+        self.error = None
+        self.created_at = time.time()
+        self.started_at, self.finished_at = None, None
+        self.files = OrderedDict((source, _new_file_state()) for source in sources)
+        self._lock = threading.Lock()
+
+    def update_file(self, source, **fields):
+        """Update the stage, page progress, result or error of one file."""
+        with self._lock:
+            self.files.setdefault(source, _new_file_state()).update(fields)
+
+    def progress_callback(self, source):
+        """Return a callback that records page progress for one file."""
+        return lambda pages_done, pages_total: self.update_file(
+            source, pages_done=pages_done, pages_total=pages_total
+        )
+
+    def to_dict(self):
+        """Return a JSON-serialisable snapshot of the job."""
+        with self._lock:
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "error": self.error,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "files": {source: dict(state) for source, state in self.files.items()},
+            }
+
+class IngestQueue:
+    """Runs ingestion jobs on a bounded worker pool so they never block the event loop."""
+
+    def __init__(self, max_concurrent_jobs, max_job_history):
+        self.max_job_history = max_job_history
+        self.jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent_jobs, thread_name_prefix="ingest")
+
+    def submit(self, sources, run):
+        """Queue run(job) in the background and return the job immediately."""
+        job = IngestJob(sources)
+        with self._lock:
+            self.jobs[job.id] = job
+            while len(self.jobs) > self.max_job_history:
+                self.jobs.popitem(last=False)
+        self._executor.submit(self._run, job, run)
+        return job
+
+    def _run(self, job, run):
+        job.status, job.started_at = "running", time.time()
+        try:
+            run(job)
+            failed = any(state["error"] for state in job.to_dict()["files"].values())
+            job.status = "done_with_errors" if failed else "done"
+        except Exception as e:
+            logger.error(f"Ingest job {job.id} failed: {e}")
+            job.status, job.error = "failed", str(e)
+        job.finished_at = time.time()
+
+    def get(self, job_id):
+        """Return a job by id, or None."""
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def list(self):
+        """Return snapshots of the retained jobs, newest first."""
+        with self._lock:
+            jobs = list(self.jobs.values())
+        return [job.to_dict() for job in reversed(jobs)]
@@ -0,0 +1,117 @@
+import bisect
+from collections import Counter
+import fitz
+
+BOLD = 16  # PyMuPDF span flag
+
+def _horizontal_gap(block, rect):
+    return max(block[0] - rect.x1, rect.x0 - block[2], 0)
+
+class PageLayout:
+    """Text blocks of one PDF page, indexed by their top and bottom edges.
+
+    Blocks are the (x0, y0, x1, y1, text, block_no, type) tuples of page.get_text("blocks"), in
+    reading order. Finding the block next to a figure or the blocks overlapping a table is a binary
+    search plus a scan of the blocks in that vertical band, rather than a pass over the whole page.
+    Blocks set in a larger or bold font than the body text are marked as headings, and chunks()
+    starts a new chunk at each of them.
+    """
+
+    def __init__(self, blocks, sizes=None, bold=None, heading_scale=1.15, heading_chars=120):
+        self.blocks = list(blocks)
+        self._by_top = sorted(range(len(self.blocks)), key=lambda i: self.blocks[i][1])
+        self._tops = [self.blocks[i][1] for i in self._by_top]
+        self._by_bottom = sorted(range(len(self.blocks)), key=lambda i: self.blocks[i][3])
+        self._bottoms = [self.blocks[i][3] for i in self._by_bottom]
+        self._max_height = max((block[3] - block[1] for block in self.blocks), default=0)
+        self.headings = set()
+        if sizes is not None:
+            self.headings = self._find_headings(sizes, bold or [False] * len(self.blocks),
+                                                heading_scale, heading_chars)
+
+    @classmethod
+    def from_page(cls, page, margin=0.1):
+        """Read the text blocks of a page outside its top and bottom margin, with their font sizes."""
+        blocks, sizes, bold = [], [], []
+        height = page.rect.height
+        for block in page.get_text("dict", flags=fitz.TEXTFLAGS_BLOCKS, sort=True)["blocks"]:
+            if block["type"] != 0 or not margin < block["bbox"][1] / height < 1 - margin:
+                continue
+            spans = [span for line in block["lines"] for span in line["spans"] if span["text"].strip()]
+            text = "".join("".join(span["text"] for span in line["spans"]) + "\n" for line in block["lines"])
+            blocks.append((*block["bbox"], text, block["number"], 0))
+            sizes.append(max((span["size"] for span in spans), default=0))
+            bold.append(bool(spans) and all(span["flags"] & BOLD for span in spans))
+        return cls(blocks, sizes, bold)
+
+    def _find_headings(self, sizes, bold, heading_scale, heading_chars):
+        """Short blocks set larger than the most common (body) font size, or entirely in bold."""
+        weights = Counter()
+        for block, size in zip(self.blocks, sizes):
+            weights[round(size, 1)] += len(block[4])
+        if not weights:
+            return set()
+        body_size = weights.most_common(1)[0][0]
+        return {i for i, block in enumerate(self.blocks)
+                if 0 < len(block[4].strip()) <= heading_chars and block[4].count("\n") <= 2
+                and (sizes[i] >= body_size * heading_scale or bold[i])}
+
+    def above(self, rect, max_distance, max_gap):
+        """Return the nearest block ending above rect, at most max_distance above and max_gap beside it."""
+        lo = bisect.bisect_left(self._bottoms, rect.y0 - max_distance)
+        for k in range(bisect.bisect_left(self._bottoms, rect.y0) - 1, lo - 1, -1):
+            block = self.blocks[self._by_bottom[k]]
+            if _horizontal_gap(block, rect) <= max_gap:
+                return block
+        return None
+
+    def below(self, rect, max_distance, max_gap):
+        """Return the nearest block starting below rect, at most max_distance below and max_gap beside it."""
+        hi = bisect.bisect_right(self._tops, rect.y1 + max_distance)
+        for k in range(bisect.bisect_right(self._tops, rect.y1), hi):
+            block = self.blocks[self._by_top[k]]
+            if _horizontal_gap(block, rect) <= max_gap:
+                return block
+        return None
+
+    def overlapping(self, rect):
+        """Return the indexes of the blocks that intersect rect."""
+        lo = bisect.bisect_right(self._tops, rect.y0 - self._max_height)
+        hi = bisect.bisect_left(self._tops, rect.y1)
+        return [i for i in self._by_top[lo:hi] if self.blocks[i][3] > rect.y0
+                and self.blocks[i][0] < rect.x1 and self.blocks[i][2] > rect.x0]
+
+    def chunks(self, char_limit=500, exclude=()):
+        """Group blocks into (heading block, text) chunks in reading order, skipping excluded indexes.
+
+        A chunk starts at every heading and runs until the next one. Consecutive headings are merged,
+        and a section longer than char_limit is split into parts that all keep its heading. Before
+        the first heading, the first block of each chunk takes the heading's place.
+        """
+        chunks, heading, body, chars = [], None, [], 0
+
+        def flush():
+            if heading is not None:
+                chunks.append((heading, "\n".join(block[4] for block in body)))
+            elif body:
+                chunks.append((body[0], "\n".join(block[4] for block in body[1:])))
+
+        for i, block in enumerate(self.blocks):
+            if i in exclude:
+                continue
+            if i in self.headings:
+                if heading is not None and not body:
+                    heading = (min(heading[0], block[0]), heading[1], max(heading[2], block[2]), block[3],
+                               heading[4] + block[4], heading[5], 0)
+                else:
+                    flush()
+                    heading = block
+                body, chars = [], len(heading[4])
+                continue
+            if body and chars + len(block[4]) > char_limit:
+                flush()
+                body, chars = [], len(heading[4]) if heading is not None else 0
+            body.append(block)
+            chars += len(block[4])
+        flush()
+        return chunks
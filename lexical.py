@@ -0,0 +1,175 @@
+import re
+import math
+import threading
+from typing import Optional
+from collections import Counter, defaultdict
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore
+from llama_index.core.vector_stores.utils import metadata_dict_to_node
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-_./:][a-z0-9]+)*")
+
+def tokenize(text):
+    """Lower-case word tokens; compound codes like "RT-AC68U" also yield their parts."""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        parts = re.split(r"[-_./:]", token)
+        if len(parts) > 1:
+            tokens.extend(part for part in parts if part)
+    return tokens
+
+class BM25Index:
+    """In-process inverted index with Okapi BM25 scoring over node ids.
+
+    Each node is visible to index versions in [added, removed), so a search can be pinned to
+    one committed version while newer nodes are still being written.
+    """
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1, self.b = k1, b
+        self._postings = defaultdict(dict)
+        self._doc_terms = {}
+        self._doc_lengths = {}
+        self._visibility = {}
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._doc_lengths)
+
+    def add(self, items, added=0, removed=math.inf):
+        """Index (node_id, text) pairs, replacing any previous text for the same id."""
+        with self._lock:
+            for node_id, text in items:
+                self._remove(node_id)
+                counts = Counter(tokenize(text))
+                for term, count in counts.items():
+                    self._postings[term][node_id] = count
+                self._doc_terms[node_id] = list(counts)
+                self._doc_lengths[node_id] = sum(counts.values())
+                self._total_length += self._doc_lengths[node_id]
+                self._visibility[node_id] = [added, removed]
+
+    def set_visibility(self, node_ids, added=None, removed=None):
+        """Change the versions in which already indexed nodes are visible."""
+        with self._lock:
+            for node_id in node_ids:
+                visibility = self._visibility.get(node_id)
+                if visibility is None:
+                    continue
+                if added is not None:
+                    visibility[0] = added
+                if removed is not None:
+                    visibility[1] = removed
+
+    def remove(self, node_ids):
+        """Drop node ids from the index."""
+        with self._lock:
+            for node_id in node_ids:
+                self._remove(node_id)
+
+    def _remove(self, node_id):
+        for term in self._doc_terms.pop(node_id, []):
+            postings = self._postings[term]
+            postings.pop(node_id, None)
+            if not postings:
+                del self._postings[term]
+        self._total_length -= self._doc_lengths.pop(node_id, 0)
+        self._visibility.pop(node_id, None)
+
+    def search(self, query, top_k, version=None):
+        """Return up to top_k (node_id, score) pairs, best first, optionally as of an index version."""
+        with self._lock:
+            doc_count = len(self._doc_lengths)
+            if not doc_count:
+                return []
+            average_length = self._total_length / doc_count
+            scores = Counter()
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for node_id, tf in postings.items():
+                    if version is not None:
+                        added, removed = self._visibility[node_id]
+                        if not added <= version < removed:
+                            continue
+                    length_norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[node_id] / average_length)
+                    scores[node_id] += idf * tf * (self.k1 + 1) / (tf + length_norm)
+        return scores.most_common(top_k)
+
+    @classmethod
+    def from_collection(cls, collection, added_key=None, removed_key=None, page_size=1000):
+        """Build the index from every document stored in a Chroma collection.
+
+        added_key and removed_key name the metadata fields holding each node's visibility range.
+        """
+        index = cls()
+        offset = 0
+        while True:
+            page = collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            for node_id, document, metadata in zip(page["ids"], page["documents"], page["metadatas"]):
+                metadata = metadata or {}
+                index.add([(node_id, document or "")], added=metadata.get(added_key, 0),
+                          removed=metadata.get(removed_key, math.inf))
+            offset += len(page["ids"])
+        return index
+
+class FusedNodeWithScore(NodeWithScore):
+    """A fused candidate: score is the RRF score, vector_score the vector similarity (None for BM25-only hits)."""
+
+    vector_score: Optional[float] = None
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """Fuse ranked lists of ids; returns (id, score) pairs, best first."""
+    scores = Counter()
+    for ranking in rankings:
+        for rank, node_id in enumerate(ranking, 1):
+            scores[node_id] += 1.0 / (k + rank)
+    return scores.most_common()
+
+class HybridRetriever(BaseRetriever):
+    """Vector and BM25 retrieval over the same Chroma collection, fused with reciprocal rank fusion.
+
+    When version is set, BM25 hits are limited to that index version; the vector retriever should
+    carry the matching metadata filters.
+    """
+
+    def __init__(self, vector_retriever, lexical_index, collection, lexical_top_k, top_k, rrf_k=60, version=None):
+        super().__init__()
+        self.version = version
+        self.vector_retriever = vector_retriever
+        self.lexical_index = lexical_index
+        self.collection = collection
+        self.lexical_top_k = lexical_top_k
+        self.top_k = top_k
+        self.rrf_k = rrf_k
+
+    def _load_nodes(self, node_ids):
+        """Fetch nodes by id from the Chroma collection."""
+        if not node_ids:
+            return {}
+        result = self.collection.get(ids=list(node_ids), include=["documents", "metadatas"])
+        deleted_ids = set(node_ids).difference(result["ids"])
+        if deleted_ids:
+            # Garbage-collected by another process before this one caught up with the removal.
+            self.lexical_index.remove(deleted_ids)
+        return {node_id: metadata_dict_to_node(metadata, text=document)
+                for node_id, document, metadata in zip(result["ids"], result["documents"], result["metadatas"])}
+
+    def _retrieve(self, query_bundle):
+        vector_results = self.vector_retriever.retrieve(query_bundle)
+        lexical_results = self.lexical_index.search(query_bundle.query_str, self.lexical_top_k, self.version)
+        nodes = {result.node.node_id: result.node for result in vector_results}
+        vector_scores = {result.node.node_id: result.score for result in vector_results}
+        nodes.update(self._load_nodes([node_id for node_id, _ in lexical_results if node_id not in nodes]))
+        fused = reciprocal_rank_fusion(
+            [[result.node.node_id for result in vector_results], [node_id for node_id, _ in lexical_results]],
+            k=self.rrf_k,
+        )
+        return [FusedNodeWithScore(node=nodes[node_id], score=score, vector_score=vector_scores.get(node_id))
+                for node_id, score in fused if node_id in nodes][:self.top_k]
@@ -0,0 +1,96 @@
+import logging
+from collections import deque
+from llama_index.core import PromptTemplate
+from llama_index.core.llms import ChatMessage, MessageRole
+from llama_index.core.base.llms.generic_utils import messages_to_history_str
+from metrics import metrics, estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = PromptTemplate(
+    """\
+    Update the summary of a conversation between a field technician and an assistant with the \
+    new messages below. Keep equipment models, error codes, steps already tried and open \
+    questions. Use at most {max_words} words.
+
+    <Summary so far>
+    {summary}
+
+    <New messages>
+    {conversation}
+
+    <Updated summary>
+    """
+)
+
+def message_tokens(message):
+    """Rough token count of a chat message, including its role."""
+    return estimate_tokens(f"{message.role.value}: {message.content or ''}")
+
+class ConversationMemory:
+    """Chat history kept within a token budget: pinned messages, a rolling summary and a recent window.
+
+    add() appends to the window. Once the window outgrows what token_budget leaves after the
+    pinned messages and summary_tokens, its oldest messages are evicted down to three quarters of
+    that share (the latest exchange always stays), so compact() folds several turns into the
+    summary with one LLM call. Without a token_budget the history grows without bound.
+    """
+
+    def __init__(self, llm, pinned=(), token_budget=None, summary_tokens=256, keep_messages=2):
+        self.llm = llm
+        self.pinned = list(pinned)
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+        self.keep_messages = keep_messages
+        self.summary = ""
+        self.window = deque()
+        self.evicted = []
+
+    def _window_budget(self):
+        return self.token_budget - sum(message_tokens(message) for message in self.pinned) - self.summary_tokens
+
+    def add(self, role, content):
+        """Append a message and evict the oldest ones once the window exceeds the budget."""
+        self.window.append(ChatMessage(role=role, content=content))
+        if self.token_budget is None:
+            return
+        window_tokens = sum(message_tokens(message) for message in self.window)
+        if window_tokens <= self._window_budget():
+            return
+        while len(self.window) > self.keep_messages and window_tokens > self._window_budget() * 3 // 4:
+            message = self.window.popleft()
+            window_tokens -= message_tokens(message)
+            self.evicted.append(message)
+
+    def needs_compaction(self):
+        return bool(self.evicted)
+
+    def compact(self):
+        """Fold the evicted messages into the rolling summary; on failure they are dropped."""
+        evicted, self.evicted = self.evicted, []
+        if not evicted:
+            return
+        prompt_args = {"summary": self.summary or "(none)", "conversation": messages_to_history_str(evicted),
+                       "max_words": self.summary_tokens * 3 // 4}
+        try:
+            with metrics.timed("chat", "summarize", messages=len(evicted)):
+                metrics.inc("remote_calls_total", service="llm", stage="summarize")
+                summary = self.llm.predict(SUMMARY_PROMPT, **prompt_args).strip()
+        except Exception as e:
+            logger.warning(f"Could not summarize {len(evicted)} chat messages, dropping them: {e}")
+            return
+        metrics.inc("tokens_total", estimate_tokens(SUMMARY_PROMPT.format(**prompt_args)),
+                    pipeline="chat", stage="summarize", direction="prompt")
+        metrics.inc("tokens_total", estimate_tokens(summary), pipeline="chat", stage="summarize", direction="completion")
+        # The model may overshoot the word limit; the summary must still fit its share of the budget.
+        self.summary = summary[:self.summary_tokens * 4]
+
+    def messages(self):
+        """Return the pinned messages, the summary as a system message and the recent window."""
+        summary = [ChatMessage(role=MessageRole.SYSTEM, content=f"Summary of the earlier conversation: {self.summary}")
+                   ] if self.summary else []
+        return self.pinned + summary + list(self.window)
+
+    def tokens(self):
+        """Return the estimated token count of messages()."""
+        return sum(message_tokens(message) for message in self.messages())
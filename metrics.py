@@ -0,0 +1,175 @@
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from config import METRICS_CONFIG
+
+HELP = {
+    "stage_seconds": "Time spent in each ingest and chat stage.",
+    "stage_errors_total": "Stages that raised an exception.",
+    "remote_calls_total": "Requests sent to remote model endpoints.",
+    "tokens_total": "Estimated tokens sent to and received from models.",
+    "bytes_total": "Bytes read from documents, sent to models and written as artifacts.",
+    "pages_total": "Document pages processed.",
+    "image_triage_total": "Images by local triage outcome; every outcome but sent_to_vlm avoided a VLM call.",
+    "chat_turns_total": "Chat turns by outcome.",
+    "chat_ttft_seconds": "Time from receiving a chat message to the first answer token.",
+    "chat_sessions": "Open chat websocket sessions.",
+    "chat_active_turns": "Chat turns being answered.",
+    "llm_slot_wait_seconds": "Time chat stages waited for one of the in-flight LLM request slots.",
+    "index_version": "Latest committed index version.",
+}
+
+_current_trace = contextvars.ContextVar("metrics_trace", default=None)
+
+def estimate_tokens(text):
+    """Rough token count of a text, about four characters per token."""
+    return len(text) // 4 + 1
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+def _format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Trace:
+    """Spans recorded for one request, in the order they finished."""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, name, started_at, seconds, **attributes):
+        with self._lock:
+            self.spans.append({"name": name, "started_at": started_at, "seconds": seconds, **attributes})
+
+    def extend(self, spans):
+        with self._lock:
+            self.spans.extend(spans)
+
+    def to_list(self):
+        """Return the spans with start offsets and durations in milliseconds."""
+        with self._lock:
+            spans = list(self.spans)
+        return [{**{key: value for key, value in span.items() if key not in ("started_at", "seconds")},
+                 "start_ms": round((span["started_at"] - self.started_at) * 1000, 1),
+                 "duration_ms": round(span["seconds"] * 1000, 1)}
+                for span in sorted(spans, key=lambda span: span["started_at"])]
+
+def current_trace():
+    """Return the trace of the request being handled, or None when it is not traced."""
+    return _current_trace.get()
+
+@contextmanager
+def tracing(enabled=True):
+    """Record the stages timed in this context (and threads started with a copy of it) as spans."""
+    if not enabled:
+        yield None
+        return
+    trace = Trace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+class Metrics:
+    """Thread-safe counters, gauges and histograms rendered in the Prometheus text format.
+
+    Series are keyed by metric name and sorted label pairs. Worker processes hand what they
+    recorded to the parent with collect(), which the parent adds to its own registry with merge().
+    """
+
+    def __init__(self, buckets, prefix="rag_"):
+        self.buckets = tuple(sorted(buckets))
+        self.prefix = prefix
+        self._counters, self._gauges, self._histograms = {}, {}, {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram[i] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    @contextmanager
+    def timed(self, pipeline, stage, **attributes):
+        """Time a stage into stage_seconds and, when the request is traced, add it as a span."""
+        started_at, start = time.time(), time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.inc("stage_errors_total", pipeline=pipeline, stage=stage)
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            self.observe("stage_seconds", seconds, pipeline=pipeline, stage=stage)
+            trace = _current_trace.get()
+            if trace is not None:
+                trace.add(stage, started_at, seconds, pipeline=pipeline, **attributes)
+
+    def collect(self):
+        """Return and reset the counters and histograms recorded so far."""
+        with self._lock:
+            collected = {"counters": self._counters, "histograms": self._histograms}
+            self._counters, self._histograms = {}, {}
+        return collected
+
+    def merge(self, collected):
+        """Add counters and histograms returned by collect() in another process."""
+        with self._lock:
+            for key, value in collected["counters"].items():
+                self._counters[key] = self._counters.get(key, 0) + value
+            for key, values in collected["histograms"].items():
+                histogram = self._histograms.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+                for i, value in enumerate(values):
+                    histogram[i] += value
+
+    def render(self):
+        """Return every series in the Prometheus text exposition format."""
+        with self._lock:
+            counters, gauges = dict(self._counters), dict(self._gauges)
+            histograms = {key: list(values) for key, values in self._histograms.items()}
+
+        lines = []
+        for kind, series in (("counter", counters), ("gauge", gauges), ("histogram", histograms)):
+            for name in sorted({name for name, _ in series}):
+                full_name = self.prefix + name
+                lines.append(f"# HELP {full_name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {full_name} {kind}")
+                for (series_name, labels), value in sorted(series.items()):
+                    if series_name != name:
+                        continue
+                    if kind != "histogram":
+                        lines.append(f"{full_name}{_format_labels(labels)} {_format_value(value)}")
+                        continue
+                    for bound, count in zip(self.buckets, value):
+                        lines.append(f"{full_name}_bucket{_format_labels(labels, [('le', bound)])} {count}")
+                    lines.append(f"{full_name}_bucket{_format_labels(labels, [('le', '+Inf')])} {value[-1]}")
+                    lines.append(f"{full_name}_sum{_format_labels(labels)} {_format_value(value[-2])}")
+                    lines.append(f"{full_name}_count{_format_labels(labels)} {value[-1]}")
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics(METRICS_CONFIG["buckets"])
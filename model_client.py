@@ -0,0 +1,85 @@
+import os
+import time
+import random
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from config import HTTP_CONFIG
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class ModelClient:
+    """Pooled HTTP client for NVIDIA model endpoints with retries and bounded parallelism."""
+
+    def __init__(self, max_concurrency, timeout, max_retries, backoff_factor):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self._session, self._executor, self._semaphore, self._pid = None, None, None, None
+        self._init_lock = threading.Lock()
+
+    def _ensure_started(self):
+        """Create the session and worker pool lazily, once per process."""
+        if self._pid == os.getpid():
+            return
+        with self._init_lock:
+            if self._pid == os.getpid():
+                return
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.max_concurrency)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            self._session = session
+            self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="model-client")
+            self._semaphore = threading.BoundedSemaphore(self.max_concurrency)
+            self._pid = os.getpid()
+
+    def _backoff(self, attempt, response=None):
+        """Sleep before a retry, honouring Retry-After when the server sends it."""
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = float(retry_after)
+        else:
+            delay = self.backoff_factor * (2 ** attempt) + random.uniform(0, self.backoff_factor)
+        time.sleep(delay)
+
+    def post(self, url, payload):
+        """POST a JSON payload to a model endpoint and return the decoded response."""
+        api_key = os.getenv("NVIDIA_API_KEY")
+        if not api_key:
+            raise ValueError("NVIDIA API Key is not set. Please set NVIDIA_API_KEY.")
+
+        self._ensure_started()
+        headers = {"Authorization": f"Bearer {api_key}", "Accept": "application/json"}
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self._semaphore:
+                    response = self._session.post(url, headers=headers, json=payload, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+                self._backoff(attempt)
+                continue
+            if response.status_code in RETRY_STATUS_CODES and attempt < self.max_retries:
+                self._backoff(attempt, response)
+                continue
+            response.raise_for_status()
+            return response.json()
+
+    def map(self, fn, items):
+        """Apply fn to every item concurrently, preserving input order."""
+        items = list(items)
+        if len(items) <= 1:
+            return [fn(item) for item in items]
+        self._ensure_started()
+        # Each call runs in a copy of the caller's context, so trace spans reach the caller's request.
+        contexts = [contextvars.copy_context() for _ in items]
+        return list(self._executor.map(lambda context, item: context.run(fn, item), contexts, items))
+
+model_client = ModelClient(
+    HTTP_CONFIG["max_concurrency"], HTTP_CONFIG["timeout"],
+    HTTP_CONFIG["max_retries"], HTTP_CONFIG["backoff_factor"]
+)
@@ -1,39 +1,69 @@
 import os
+import time
+import uuid
+import shutil
+import asyncio
 import logging
+import functools
+import threading
+import contextvars
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import FastAPI, WebSocket, UploadFile, File, HTTPException
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.background import BackgroundTasks
 from pydantic import BaseModel
 from llama_index.postprocessor.nvidia_rerank import NVIDIARerank
-from llama_index.core import Settings, VectorStoreIndex, StorageContext
+from llama_index.core import Settings
 from llama_index.core.node_parser import SentenceSplitter
-from llama_index.vector_stores.chroma import ChromaVectorStore
 import chromadb
 from llama_index.embeddings.nvidia import NVIDIAEmbedding
 from llama_index.llms.nvidia import NVIDIA
-from document_processors import load_multimodal_data, load_data_from_directory
+from document_processors import iter_multimodal_data, prefetch_presentations
+from indexing import IndexManager
+from artifacts import hash_file
+from jobs import IngestQueue
+from streaming import StreamGuard, iterate_in_thread
+from chat_session import ChatSession
+from lexical import HybridRetriever
+from rerank import CachedReranker
+from term_matcher import load_blocked_terms
+from semantic_cache import SemanticCache
+from embeddings import CachedEmbedding
+from cache import ModelCache
+from metrics import metrics, tracing, estimate_tokens
 from llama_index.core.node_parser import (
     SentenceSplitter,
     SemanticSplitterNodeParser,
 )
-from nemoguardrails import LLMRails, RailsConfig
 from llama_index.core import PromptTemplate
 from llama_index.core.llms import ChatMessage, MessageRole
-from llama_index.core.chat_engine import CondenseQuestionChatEngine
 from llama_index.core.chat_engine import SimpleChatEngine
 from utils import set_environment_variables
-from config import LLM_CONFIG
-import nest_asyncio
+from config import (
+    LLM_CONFIG, INDEX_CONFIG, INGEST_CONFIG, CHAT_CONFIG, RAILS_CONFIG, SEMANTIC_CACHE_CONFIG, EMBED_CONFIG,
+    RETRIEVAL_CONFIG, RERANK_CONFIG, METRICS_CONFIG
+)
 
-nest_asyncio.apply()
 set_environment_variables()
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
-config = RailsConfig.from_path('config')
-rails = LLMRails(config)
+rails = None
+rails_lock = threading.Lock()
+
+def get_rails():
+    """Build the guardrails on first use; loading their models takes far longer than anything else at startup."""
+    global rails
+    with rails_lock:
+        if rails is None:
+            from nemoguardrails import LLMRails, RailsConfig
+            start = time.perf_counter()
+            rails = LLMRails(RailsConfig.from_path(RAILS_CONFIG["config_path"]))
+            logger.info(f"Guardrails loaded in {time.perf_counter() - start:.1f}s.")
+    return rails
 
 # Initialize FastAPI
 app = FastAPI()
@@ -49,7 +79,13 @@ app.add_middleware(
 
 # Initialize settings
 def initialize_settings():
-    Settings.embed_model = NVIDIAEmbedding(model=LLM_CONFIG["embed_model"], truncate="END")
+    Settings.embed_model = CachedEmbedding(
+        lambda: NVIDIAEmbedding(model=LLM_CONFIG["embed_model"], truncate="END"),
+        ModelCache(EMBED_CONFIG["cache_path"], EMBED_CONFIG["cache_max_bytes"]),
+        batch_size=EMBED_CONFIG["batch_size"],
+        max_concurrency=EMBED_CONFIG["max_concurrency"],
+        model_name=LLM_CONFIG["embed_model"],
+    )
     Settings.llm = NVIDIA(model=LLM_CONFIG["llm"])
     Settings.text_splitter = SentenceSplitter(chunk_size=600)
     Settings.node_parser = SemanticSplitterNodeParser(buffer_size=1, embed_model=Settings.embed_model)
@@ -59,9 +95,28 @@ initialize_settings()
 
 
 # Chroma vector store client setup
-chroma_client = chromadb.PersistentClient(path="./chroma_db")
-reranker = NVIDIARerank(model="nvidia/nv-rerankqa-mistral-4b-v3", top_n=4)
+chroma_client = chromadb.PersistentClient(path=INDEX_CONFIG["chroma_path"])
+index_manager = IndexManager(chroma_client, INDEX_CONFIG["collection"], INDEX_CONFIG["manifest_path"],
+                             document_batch_size=INDEX_CONFIG["document_batch_size"],
+                             write_batch_size=INDEX_CONFIG["write_batch_size"],
+                             gc_grace_seconds=INDEX_CONFIG["gc_grace_seconds"])
+answer_cache = SemanticCache(SEMANTIC_CACHE_CONFIG["threshold"], SEMANTIC_CACHE_CONFIG["ttl"],
+                             SEMANTIC_CACHE_CONFIG["max_entries"])
+index_manager.on_change(answer_cache.invalidate)
+ingest_queue = IngestQueue(INGEST_CONFIG["max_concurrent_jobs"], INGEST_CONFIG["max_job_history"])
+reranker = CachedReranker(
+    lambda: NVIDIARerank(model=RERANK_CONFIG["model"], top_n=RERANK_CONFIG["candidates"]),
+    ModelCache(RERANK_CONFIG["cache_path"], RERANK_CONFIG["cache_max_bytes"]),
+    top_n=RERANK_CONFIG["top_n"],
+    skip_margin=RERANK_CONFIG["skip_margin"],
+    model=RERANK_CONFIG["model"],
+)
 simple_chat_engine = SimpleChatEngine.from_defaults(llm = NVIDIA(model=LLM_CONFIG["llm"]))
+# Blocking stages of chat turns run on their own bounded pool instead of the event loop, and
+# llm_slots caps the LLM and rails requests in flight across all sessions.
+chat_executor = ThreadPoolExecutor(max_workers=CHAT_CONFIG["max_workers"], thread_name_prefix="chat")
+llm_slots = asyncio.Semaphore(CHAT_CONFIG["max_inflight_llm"])
+chat_sessions, active_turns = 0, 0
 custom_prompt = PromptTemplate(
     """\
     Given a conversation (between Human and Assistant) and a follow up message from Human, \
@@ -93,101 +148,405 @@ custom_chat_history = [
     ),
 ]
 
-# Helper function to create an index
-def create_index(documents):
-    try:
-        chroma_collection = chroma_client.create_collection("quickstart")
-        logger.info("Chroma collection created.")
-    except:
-        chroma_client.delete_collection("quickstart")
-        chroma_collection = chroma_client.create_collection("quickstart")
-        logger.info("Existing Chroma collection deleted and recreated.")
-    
-    vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
-    storage_context = StorageContext.from_defaults(vector_store=vector_store)
-    return VectorStoreIndex.from_documents(documents, storage_context=storage_context, show_progress=True)
+# Helper function to index a single source incrementally
+def index_source(source, content_hash, load_documents):
+    """Index one source and publish it to chat as a new index version; unchanged sources are skipped."""
+    return index_manager.ingest(source, content_hash, load_documents)
+
+def build_retriever(snapshot):
+    """Return the first-stage retriever for an index snapshot: hybrid vector + BM25, or vector only."""
+    if not RETRIEVAL_CONFIG["hybrid"]:
+        return snapshot.retriever(RETRIEVAL_CONFIG["similarity_top_k"])
+    return HybridRetriever(
+        snapshot.retriever(RETRIEVAL_CONFIG["vector_top_k"]),
+        index_manager.lexical_index,
+        index_manager.collection,
+        lexical_top_k=RETRIEVAL_CONFIG["lexical_top_k"],
+        top_k=RERANK_CONFIG["candidates"] if RERANK_CONFIG["enabled"] else RETRIEVAL_CONFIG["fused_top_k"],
+        rrf_k=RETRIEVAL_CONFIG["rrf_k"],
+        version=snapshot.version,
+    )
 
 # Endpoint for uploading files or directory path
 class DirectoryPathRequest(BaseModel):
     directory_path: str
+    trace: bool = False
+
+class SourceRequest(BaseModel):
+    source: str
+
+def ingest_file(job, source, path, uploaded=False, trace=False):
+    """Hash, extract and index one file, recording its stage and progress on the job."""
+    with tracing(trace or METRICS_CONFIG["log_traces"]) as file_trace:
+        _ingest_file(job, source, path, uploaded)
+    if file_trace is not None:
+        spans = file_trace.to_list()
+        if trace:
+            job.update_file(source, trace=spans)
+        if METRICS_CONFIG["log_traces"]:
+            logger.info(f"{source}: trace {spans}")
+
+def _ingest_file(job, source, path, uploaded):
+    def load_documents():
+        job.update_file(source, stage="extracting")
+        errors = []
+        load_options = {"progress": job.progress_callback(source), "on_error": lambda _, e: errors.append(e)}
+        if uploaded:
+            with open(path, "rb") as f:
+                yield from iter_multimodal_data([UploadFile(file=f, filename=source)], **load_options)
+        else:
+            yield from iter_multimodal_data([path], **load_options)
+        if errors:
+            raise errors[0]
+        job.update_file(source, stage="indexing")
+
+    try:
+        job.update_file(source, stage="hashing")
+        embedding_before = Settings.embed_model.stats()
+        result = index_source(source, hash_file(path), load_documents)
+        embedding = CachedEmbedding.stats_delta(embedding_before, Settings.embed_model.stats())
+        logger.info(f"{source}: embedding {embedding}")
+        job.update_file(source, stage="done", result=result, embedding=embedding)
+    except Exception as e:
+        logger.error(f"Error ingesting {source}: {e}")
+        job.update_file(source, stage="failed", error=str(e))
+
+def ingest_uploads(job, uploads, upload_dir, trace=False):
+    """Background job: index spooled uploads, then delete the spool directory."""
+    try:
+        prefetch_presentations([path for _, path in uploads])
+        for source, path in uploads:
+            ingest_file(job, source, path, uploaded=True, trace=trace)
+    finally:
+        shutil.rmtree(upload_dir, ignore_errors=True)
+    logger.info(f"Files processed and index updated (job {job.id}).")
+
+def ingest_directory(job, directory_path, file_paths, trace=False):
+    """Background job: index every file of a directory and drop files that disappeared."""
+    prefetch_presentations(file_paths)
+    for file_path in file_paths:
+        ingest_file(job, file_path, file_path, trace=trace)
+    for file_path in index_manager.remove_missing(directory_path):
+        job.update_file(file_path, stage="done", result="removed")
+    logger.info(f"Directory processed and index updated (job {job.id}).")
+
+def spool_upload(file, upload_dir):
+    """Copy an uploaded file to disk so it outlives the request."""
+    os.makedirs(upload_dir, exist_ok=True)
+    path = os.path.join(upload_dir, os.path.basename(file.filename))
+    with open(path, "wb") as out:
+        shutil.copyfileobj(file.file, out)
+    return path
+
+@app.on_event("startup")
+async def load_rails_in_background():
+    """Start loading the guardrails without holding up startup; the first chat waits if needed."""
+    threading.Thread(target=get_rails, name="rails-loader", daemon=True).start()
 
-@app.post("/upload-files")
-async def upload_files(files: list[UploadFile] = File(...)):
-    """Endpoint for uploading multiple files."""
-    global index
-    documents = load_multimodal_data(files)
-    index = create_index(documents)
-    logger.info("Files processed and index created!")
-    return {"message": "Files processed and index created successfully"}
+@app.get("/health")
+async def health():
+    """Readiness endpoint: the service answers as soon as the persisted index is attached."""
+    return {"status": "ok", "index_version": index_manager.version, "rails_loaded": rails is not None}
 
-@app.post("/upload-directory")
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus scrape endpoint: stage latency histograms and call, token and byte counters."""
+    metrics.set("index_version", index_manager.version)
+    metrics.set("chat_sessions", chat_sessions)
+    metrics.set("chat_active_turns", active_turns)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.post("/upload-files", status_code=202)
+async def upload_files(files: list[UploadFile] = File(...), trace: bool = False):
+    """Endpoint for uploading multiple files; they are indexed by a background job.
+
+    With ?trace=true the job records per-file stage spans.
+    """
+    upload_dir = os.path.join(INGEST_CONFIG["upload_dir"], uuid.uuid4().hex)
+    uploads = [(file.filename, await asyncio.to_thread(spool_upload, file, upload_dir)) for file in files]
+    job = ingest_queue.submit([source for source, _ in uploads],
+                              lambda job: ingest_uploads(job, uploads, upload_dir, trace))
+    logger.info(f"Files queued for ingestion (job {job.id}).")
+    return {"message": "Files queued for ingestion", "job_id": job.id}
+
+@app.post("/upload-directory", status_code=202)
 async def upload_directory(data: DirectoryPathRequest):
-    """Endpoint for processing a directory path."""
-    global index
+    """Endpoint for processing a directory path; it is indexed by a background job."""
     directory_path = data.directory_path
     if not os.path.isdir(directory_path):
         raise HTTPException(status_code=400, detail="Invalid directory path")
-    documents = load_data_from_directory(directory_path)
-    index = create_index(documents)
-    logger.info("Directory processed and index created!")
-    return {"message": "Directory processed and index created successfully"}
+    file_paths = [os.path.join(directory_path, filename) for filename in sorted(os.listdir(directory_path))
+                  if os.path.isfile(os.path.join(directory_path, filename))]
+    job = ingest_queue.submit(file_paths, lambda job: ingest_directory(job, directory_path, file_paths, data.trace))
+    logger.info(f"Directory queued for ingestion (job {job.id}).")
+    return {"message": "Directory queued for ingestion", "job_id": job.id}
+
+@app.get("/ingest-jobs")
+async def list_ingest_jobs():
+    """Endpoint for listing recent ingestion jobs."""
+    return {"jobs": ingest_queue.list()}
+
+@app.get("/ingest-jobs/{job_id}")
+async def get_ingest_job(job_id: str):
+    """Endpoint for the status of one ingestion job: per-file stage, pages done and errors."""
+    job = ingest_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job id")
+    return job.to_dict()
+
+@app.post("/remove-source")
+async def remove_source(data: SourceRequest):
+    """Endpoint for removing every node produced by one source."""
+    if not await asyncio.to_thread(index_manager.remove_source, data.source):
+        raise HTTPException(status_code=404, detail="Unknown source")
+    logger.info(f"Source removed from index: {data.source}")
+    return {"message": f"Source {data.source} removed from index"}
+
+async def run_blocking(fn, *args):
+    """Run a blocking call on the chat executor, in a copy of the caller's context."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(chat_executor, functools.partial(contextvars.copy_context().run, fn, *args))
+
+@asynccontextmanager
+async def llm_slot():
+    """Hold one of the in-flight LLM request slots, waiting for a free one."""
+    start = time.perf_counter()
+    await llm_slots.acquire()
+    metrics.observe("llm_slot_wait_seconds", time.perf_counter() - start)
+    try:
+        yield
+    finally:
+        llm_slots.release()
+
+async def check_input(message):
+    """Run the input rails on a message; returns None if allowed, else the refusal message."""
+    rails = await run_blocking(get_rails)
+    async with llm_slot():
+        with metrics.timed("chat", "input_rail"):
+            metrics.inc("remote_calls_total", service="rails", stage="input_rail")
+            input_rail = await rails.generate_async(prompt=message, options={
+                "rails": ["input"],
+                "log": {
+                    "activated_rails": True
+                }
+            })
+    return None if input_rail.response == message else input_rail.response
+
+async def prepare(session, message):
+    """Condense and retrieve for a message on the chat executor once an LLM slot is free.
+
+    The slot is held until the executor thread is done, even if the caller is cancelled.
+    """
+    async with llm_slot():
+        work = asyncio.ensure_future(run_blocking(session.prepare, message))
+        try:
+            return await asyncio.shield(work)
+        except asyncio.CancelledError:
+            await asyncio.wait([work])
+            raise
+
+async def discard_prepare(session, prepare_task):
+    """Wait for an unneeded prepare to finish, then release the index version it pinned.
+
+    Its executor thread cannot be interrupted, and ChatSession is not thread-safe, so the next
+    turn must not start while it still runs.
+    """
+    await asyncio.wait([prepare_task])
+    if not prepare_task.cancelled() and prepare_task.exception() is not None:
+        logger.debug(f"Discarded prepare failed: {prepare_task.exception()}")
+    await run_blocking(session.close)
+
+async def check_input_and_prepare(session, message, refuse):
+    """Run the input rail and condense/retrieve for a message; returns the prepared turn, or None.
+
+    If the rail blocks the message, refuse(refusal) is awaited and None is returned. With overlap
+    enabled, condensation and retrieval run while the input rail is checked. When the message is
+    blocked, the refusal is sent first and their result is discarded once they have finished.
+    """
+    if not CHAT_CONFIG["overlap_input_rail"]:
+        refusal = await check_input(message)
+        if refusal is not None:
+            await refuse(refusal)
+            return None
+        return await prepare(session, message)
+
+    prepare_task = asyncio.ensure_future(prepare(session, message))
+    try:
+        refusal = await check_input(message)
+    except BaseException:
+        await discard_prepare(session, prepare_task)
+        raise
+    if refusal is not None:
+        try:
+            await refuse(refusal)
+        finally:
+            await discard_prepare(session, prepare_task)
+        return None
+    return await prepare_task
+
+async def check_output(message, answer):
+    """Run the output rails on an answer to a message; returns None if allowed, else the replacement.
+
+    Only the latest exchange is sent, so the rail's cost does not grow with the conversation.
+    """
+    rails = await run_blocking(get_rails)
+    async with llm_slot():
+        with metrics.timed("chat", "output_rail", chars=len(answer)):
+            metrics.inc("remote_calls_total", service="rails", stage="output_rail")
+            messages = [{"role": "user", "content": message}, {"role": "assistant", "content": answer}]
+            output_rail = await rails.generate_async(messages=messages, options={
+                "rails": ["output"],
+                "log": {
+                    "activated_rails": True
+                }
+            })
+    content = output_rail.response[0]["content"]
+    return None if content == answer else content
+
+async def stream_answer(websocket, session, message, prepared, stream, start):
+    """Answer a prepared turn, forwarding tokens as they arrive when stream is set.
+
+    Output rails run on chunks of the answer while it streams. If a chunk is blocked the stream
+    stops and a "retract" frame replaces what the client has shown so far. A non-streamed answer
+    goes through the output rails once, when it is complete.
+    """
+    first_token_at = None
+    # Chunk checks only pay off while tokens reach the client; otherwise the full answer is checked once.
+    check_chars = CHAT_CONFIG["stream_check_chars"] if stream else float("inf")
+    guard = StreamGuard(lambda text: check_output(message, text), check_chars,
+                        term_stream=load_blocked_terms().stream(),
+                        blocked_message=RAILS_CONFIG["blocked_terms_message"])
+    replacement = None
+    async with llm_slot():
+        with metrics.timed("chat", "synthesize", nodes=len(prepared.nodes)):
+            metrics.inc("remote_calls_total", service="llm", stage="synthesize")
+            response_gen = await run_blocking(session.synthesize, prepared.question, prepared.nodes)
+            async for delta in iterate_in_thread(response_gen, chat_executor):
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                    metrics.observe("chat_ttft_seconds", first_token_at - start)
+                guard.feed(delta)
+                replacement = guard.blocked()
+                if replacement is not None:
+                    guard.cancel()
+                    break
+                if stream:
+                    await websocket.send_json({"role": "assistant", "type": "token", "content": delta})
+    if replacement is None:
+        replacement = await guard.finish()
+    prompt = prepared.question + "".join(node.get_content() for node in prepared.nodes)
+    metrics.inc("tokens_total", estimate_tokens(prompt), pipeline="chat", stage="synthesize", direction="prompt")
+    metrics.inc("tokens_total", estimate_tokens(guard.text), pipeline="chat", stage="synthesize", direction="completion")
+    metrics.inc("chat_turns_total", outcome="answered" if replacement is None else "retracted")
+
+    answer = guard.text if replacement is None else replacement
+    ttft_ms = round(((first_token_at or time.perf_counter()) - start) * 1000, 1)
+    total_ms = round((time.perf_counter() - start) * 1000, 1)
+    logger.info(f"Chat turn answered: ttft={ttft_ms}ms total={total_ms}ms stream={stream} retracted={replacement is not None}")
+    if not stream:
+        await websocket.send_json({"role": "assistant", "content": answer})
+    elif replacement is not None:
+        await websocket.send_json({"role": "assistant", "type": "retract", "content": replacement})
+    else:
+        await websocket.send_json({"role": "assistant", "type": "end", "content": answer,
+                                   "ttft_ms": ttft_ms, "total_ms": total_ms})
+    if replacement is None:
+        session.remember(prepared, answer)
+    return answer
+
+async def send_cached_answer(websocket, answer, stream, start):
+    """Send an answer served from the semantic cache."""
+    total_ms = round((time.perf_counter() - start) * 1000, 1)
+    logger.info(f"Chat turn answered from semantic cache: total={total_ms}ms")
+    metrics.inc("chat_turns_total", outcome="cached")
+    if stream:
+        await websocket.send_json({"role": "assistant", "type": "end", "content": answer, "cached": True,
+                                   "ttft_ms": total_ms, "total_ms": total_ms})
+    else:
+        await websocket.send_json({"role": "assistant", "content": answer})
+
+async def answer_turn(websocket, session, data):
+    """Answer one chat message, or shed it with a busy reply when max_active_turns are in progress."""
+    global active_turns
+    if active_turns >= CHAT_CONFIG["max_active_turns"]:
+        metrics.inc("chat_turns_total", outcome="busy")
+        await websocket.send_json({"role": "assistant", "type": "busy", "content": CHAT_CONFIG["busy_message"]})
+        return
+    active_turns += 1
+    try:
+        await _answer_turn(websocket, session, data)
+    finally:
+        active_turns -= 1
+
+async def _answer_turn(websocket, session, data):
+    """Check, prepare and answer one chat message, then record the exchange.
+
+    Once the answer is sent, messages that fell out of the memory's window are summarized, so the
+    summary call adds no latency to the turn itself.
+    """
+    start = time.perf_counter()
+
+    async def refuse(refusal):
+        metrics.inc("chat_turns_total", outcome="refused")
+        await websocket.send_json({"role": "assistant", "content": refusal})
+
+    prepared = await check_input_and_prepare(session, data["content"], refuse)
+    if prepared is None:
+        return
+    stream = data.get("stream", CHAT_CONFIG["stream"])
+    if prepared.cached_answer is not None:
+        answer = prepared.cached_answer
+        await send_cached_answer(websocket, answer, stream, start)
+    else:
+        answer = await stream_answer(websocket, session, data["content"], prepared, stream, start)
+    session.record(data["content"], answer)
+    if session.memory.needs_compaction():
+        async with llm_slot():
+            await run_blocking(session.memory.compact)
+    logger.info(f"User query processed: {data}")
 
 # WebSocket endpoint for chat interaction
 @app.websocket("/chat")
 async def websocket_chat(websocket: WebSocket):
+    """Chat session: turns are answered one at a time, so a client sending faster than it is
+    answered is held back by the websocket itself rather than queued without bound."""
+    global chat_sessions
     await websocket.accept()
     while True:
-        if 'index' not in globals():
+        if await run_blocking(index_manager.is_empty):
             data = await websocket.receive_json()
-            response = simple_chat_engine.chat(data["content"])
+            async with llm_slot():
+                response = await simple_chat_engine.achat(data["content"])
             await websocket.send_json({"role":"assistant", "content":str(response)})
             continue
         else:
             break
         # await websocket.close()
         # return
-    query_engine = index.as_query_engine(similarity_top_k=20)
-    chat_engine = CondenseQuestionChatEngine.from_defaults(
-        query_engine=query_engine,
-        condense_question_prompt=custom_prompt,
-        chat_history=custom_chat_history,
-        verbose=True,
-    )
-    history = []
+    session = ChatSession(index_manager, Settings.llm, custom_prompt, custom_chat_history, build_retriever,
+                          answer_cache=answer_cache if SEMANTIC_CACHE_CONFIG["enabled"] else None,
+                          node_postprocessors=[reranker] if RERANK_CONFIG["enabled"] else None,
+                          memory_tokens=CHAT_CONFIG["memory_tokens"], summary_tokens=CHAT_CONFIG["summary_tokens"])
+    chat_sessions += 1
     
     try:
         while True:
             data = await websocket.receive_json()
-            input_rail = rails.generate(prompt=data["content"], options={
-                "rails": ["input"],
-                "log": {
-                    "activated_rails": True
-                }
-            })
-            if input_rail.response == data["content"]:
-                history.append(data)
-            else:
-                history.append({"role": "assistant", "content": input_rail.response})
-                await websocket.send_json({"role": "assistant", "content": input_rail.response})
-                continue
-            response = chat_engine.chat(data["content"])
-            history.append({"role": "assistant", "content": str(response)})
-            print(response)
-            output_rail = rails.generate(messages=history, options={
-                "rails": ["output"],
-                "log": {
-                    "activated_rails": True
-                }
-            })
-            if output_rail.response[0]["content"] == str(response):
-                await websocket.send_json({"role": "assistant", "content": str(response)})
-            else:
-                await websocket.send_json({"role": "assistant", "content": output_rail.response[0]["content"]})
-            logger.info(f"User query processed: {data}")
+            with tracing(data.get("trace", False) or METRICS_CONFIG["log_traces"]) as trace:
+                await answer_turn(websocket, session, data)
+            if trace is not None:
+                spans = trace.to_list()
+                if data.get("trace", False):
+                    await websocket.send_json({"role": "assistant", "type": "trace", "spans": spans})
+                if METRICS_CONFIG["log_traces"]:
+                    logger.info(f"Chat turn trace: {spans}")
 
     except Exception as e:
         logger.error(f"Error during WebSocket communication: {str(e)}")
         await websocket.close()
+    finally:
+        chat_sessions -= 1
+        session.close()
 
 # HTML for testing the WebSocket chat endpoint
 @app.get("/")
@@ -208,21 +567,31 @@ async def get():
         </ul>
         <script>
             var ws = new WebSocket("ws://localhost:8000/chat");
+            var streaming = null;
             ws.onmessage = function(event) {
+                var data = JSON.parse(event.data);
                 var messages = document.getElementById('messages');
-                var message = document.createElement('li');
-                var content = document.createTextNode(event.data);
-                message.appendChild(content);
+                if (data.type === "token") {
+                    if (streaming === null) {
+                        streaming = document.createElement('li');
+                        messages.appendChild(streaming);
+                    }
+                    streaming.textContent += data.content;
+                    return;
+                }
+                var message = streaming || document.createElement('li');
+                message.textContent = data.content;
                 messages.appendChild(message);
+                streaming = null;
             };
             document.getElementById('messageForm').onsubmit = function(event) {
                 event.preventDefault();
                 var input = document.getElementById("messageText");
-                ws.send(input.value);
+                ws.send(JSON.stringify({"role": "user", "content": input.value, "stream": true}));
                 input.value = '';
             };
         </script>
     </body>
     </html>
     """
-    return HTMLResponse(content=html_content)
\ No newline at end of file
+    return HTMLResponse(content=html_content)
@@ -0,0 +1,203 @@
+import os
+import atexit
+import shutil
+import signal
+import tempfile
+import threading
+import subprocess
+import multiprocessing
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+import fitz
+from artifacts import hash_file
+from metrics import metrics
+from config import INGEST_CONFIG
+
+PRESENTATION_EXTENSIONS = ('.ppt', '.pptx')
+
+class OfficeConverter:
+    """Converts presentations to PDF with headless LibreOffice, many files per invocation.
+
+    PDFs are stored by the content hash of the source, so an unchanged deck is never converted
+    twice. prefetch() queues whole batches on a single background thread, and convert() waits
+    for a queued conversion or converts the file on its own. Every invocation reuses one
+    LibreOffice profile per process and is killed after timeout seconds per file in the batch.
+    """
+
+    def __init__(self, output_dir, binary="libreoffice", timeout=120, batch_size=16):
+        self.output_dir = output_dir
+        self.binary = binary
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.converted, self.invocations = 0, 0
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._executor, self._profile_dir, self._pid = None, None, None
+
+    def _start(self):
+        """Create the worker thread and LibreOffice profile lazily, once per process."""
+        if self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="office")
+            self._profile_dir = tempfile.mkdtemp(prefix="libreoffice-profile-")
+            atexit.register(shutil.rmtree, self._profile_dir, True)
+            self._pending, self._pid = {}, os.getpid()
+
+    def pdf_path(self, digest):
+        return os.path.join(self.output_dir, f"{digest}.pdf")
+
+    def prefetch(self, paths):
+        """Start converting the given files in the background, in batches of batch_size.
+
+        Returns a future per content hash for the files that were not converted yet.
+        """
+        jobs = {}
+        for path in paths:
+            try:
+                jobs.setdefault(hash_file(path), path)
+            except OSError:
+                continue  # reported when the file itself is processed
+        with self._lock:
+            self._start()
+            pending = {digest: self._pending[digest] for digest in jobs if digest in self._pending}
+            todo = [(digest, path) for digest, path in jobs.items()
+                    if digest not in pending and not os.path.exists(self.pdf_path(digest))]
+            for start in range(0, len(todo), self.batch_size):
+                batch = todo[start:start + self.batch_size]
+                futures = {digest: Future() for digest, _ in batch}
+                self._pending.update(futures)
+                pending.update(futures)
+                self._executor.submit(self._convert_batch, batch, futures)
+        return pending
+
+    def convert(self, path):
+        """Return the PDF of a file, converting it now unless it is converted or queued already."""
+        digest = hash_file(path)
+        future = self.prefetch([path]).get(digest)
+        return future.result() if future is not None else self.pdf_path(digest)
+
+    def _convert_batch(self, batch, futures):
+        try:
+            results = self._run(batch)
+            if len(batch) > 1 and any(isinstance(result, Exception) for result in results.values()):
+                # One bad file can fail a whole invocation; retry the failures one by one.
+                for digest, path in batch:
+                    if isinstance(results[digest], Exception):
+                        results.update(self._run([(digest, path)]))
+        except Exception as e:
+            results = {digest: e for digest, _ in batch}
+        with self._lock:
+            for digest, _ in batch:
+                self._pending.pop(digest, None)
+        for digest, result in results.items():
+            if isinstance(result, Exception):
+                futures[digest].set_exception(result)
+            else:
+                futures[digest].set_result(result)
+
+    def _run(self, batch):
+        """Convert one batch in a single LibreOffice invocation; returns digest -> PDF path or error."""
+        work_dir = tempfile.mkdtemp(prefix="office-batch-")
+        try:
+            inputs = []
+            for digest, path in batch:
+                # Inputs are named by digest, so decks with the same file name do not collide.
+                staged = os.path.join(work_dir, digest + os.path.splitext(path)[1].lower())
+                shutil.copyfile(path, staged)
+                inputs.append(staged)
+            command = [self.binary, "--headless", "--norestore",
+                       f"-env:UserInstallation=file://{os.path.abspath(self._profile_dir)}",
+                       "--convert-to", "pdf", "--outdir", os.path.join(work_dir, "out"), *inputs]
+            with metrics.timed("ingest", "office_convert", files=len(batch)):
+                error = self._invoke(command, self.timeout * len(batch))
+            self.invocations += 1
+
+            os.makedirs(self.output_dir, exist_ok=True)
+            results = {}
+            for digest, path in batch:
+                converted = os.path.join(work_dir, "out", f"{digest}.pdf")
+                if os.path.exists(converted):
+                    os.replace(converted, self.pdf_path(digest))
+                    results[digest] = self.pdf_path(digest)
+                    self.converted += 1
+                else:
+                    results[digest] = RuntimeError(f"LibreOffice did not convert {path}: {error or 'no output'}")
+            return results
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    @staticmethod
+    def _invoke(command, timeout):
+        """Run LibreOffice, killing its whole process group on timeout; returns an error or None."""
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                   start_new_session=hasattr(os, "killpg"))
+        try:
+            _, stderr = process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            if hasattr(os, "killpg"):
+                os.killpg(process.pid, signal.SIGKILL)
+            else:
+                process.kill()
+            process.communicate()
+            return f"timed out after {timeout}s"
+        if process.returncode != 0:
+            return f"exit code {process.returncode}: {stderr.decode(errors='replace').strip()[-500:]}"
+        return None
+
+    def stats(self):
+        """Return how many files were converted and in how many LibreOffice invocations."""
+        return {"converted": self.converted, "invocations": self.invocations}
+
+def render_pages(pdf_path, start, end):
+    """Render pages [start, end) of a PDF to PNG bytes."""
+    with fitz.open(pdf_path) as doc:
+        images = []
+        for i in range(start, end):
+            with metrics.timed("ingest", "render_pixmap", page=i):
+                images.append(doc.load_page(i).get_pixmap().tobytes())
+    return images
+
+def _render_pages_task(pdf_path, start, end):
+    """Worker task: render_pages plus the metrics it recorded in the worker process."""
+    return render_pages(pdf_path, start, end), metrics.collect()
+
+class PageRenderer:
+    """Renders PDF pages to PNG bytes, in a long-lived process pool for documents with many pages.
+
+    The pool is started on first use and kept for later documents, so its start-up cost is paid
+    once per process rather than once per deck.
+    """
+
+    def __init__(self, workers, min_pages, pages_per_task):
+        self.workers = workers
+        self.min_pages = min_pages
+        self.pages_per_task = pages_per_task
+        self._lock = threading.Lock()
+        self._pool, self._pid = None, None
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+                self._pid = os.getpid()
+        return self._pool
+
+    def render(self, pdf_path):
+        """Return the PNG bytes of every page, in page order."""
+        with fitz.open(pdf_path) as doc:
+            page_count = len(doc)
+        if self.workers <= 1 or page_count < self.min_pages:
+            return render_pages(pdf_path, 0, page_count)
+        pool = self._get_pool()
+        futures = [pool.submit(_render_pages_task, pdf_path, start, min(start + self.pages_per_task, page_count))
+                   for start in range(0, page_count, self.pages_per_task)]
+        images = []
+        for future in futures:
+            task_images, worker_metrics = future.result()
+            metrics.merge(worker_metrics)
+            images.extend(task_images)
+        return images
+
+office_converter = OfficeConverter(INGEST_CONFIG["office_output_dir"], INGEST_CONFIG["office_binary"],
+                                   INGEST_CONFIG["office_timeout"], INGEST_CONFIG["office_batch_size"])
+page_renderer = PageRenderer(INGEST_CONFIG["pdf_workers"], INGEST_CONFIG["pdf_parallel_min_pages"],
+                             INGEST_CONFIG["pdf_pages_per_task"])
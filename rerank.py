@@ -0,0 +1,81 @@
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import MetadataMode, NodeWithScore
+from cache import ModelCache, LazyModel, Counters
+from metrics import metrics
+
+class CachedReranker(BaseNodePostprocessor):
+    """Second retrieval stage: rerank candidates and keep the best top_n for synthesis.
+
+    Scores are cached per (question, node content), so repeated questions and overlapping
+    candidate sets are only sent to the rerank model once. When the vector similarity scores
+    already show a clear winner (the best leads the runner-up by at least skip_margin, relative
+    to the best) that is also ranked first, reranking is skipped and the first-stage order is
+    kept. Fused candidates carry their similarity in vector_score, since their score is an RRF
+    score. inner may also be a factory (see LazyModel), in which case model is required.
+    """
+
+    top_n: int = 4
+    skip_margin: float = 0.3
+
+    _inner: LazyModel = PrivateAttr()
+    _cache: ModelCache = PrivateAttr()
+    _model: str = PrivateAttr()
+    _stats: Counters = PrivateAttr()
+
+    def __init__(self, inner, cache, top_n=4, skip_margin=0.3, model=None, **kwargs):
+        super().__init__(top_n=top_n, skip_margin=skip_margin, **kwargs)
+        self._inner = LazyModel(inner, BaseNodePostprocessor)
+        self._cache = cache
+        self._model = model or getattr(inner, "model", None) or inner.class_name()
+        self._stats = Counters("queries", "skipped", "nodes_reranked", "cache_hits")
+
+    @classmethod
+    def class_name(cls):
+        return "CachedReranker"
+
+    def stats(self):
+        """Return a copy of the rerank counters."""
+        return self._stats.snapshot()
+
+    def has_clear_winner(self, nodes):
+        """Check whether the vector similarity scores single out the node ranked first."""
+        if len(nodes) < 2:
+            return True
+        similarity = [getattr(node, "vector_score", node.score) or 0.0 for node in nodes]
+        order = sorted(range(len(nodes)), key=lambda i: similarity[i], reverse=True)
+        best, runner_up = similarity[order[0]], similarity[order[1]]
+        if best <= 0 or (best - runner_up) / best < self.skip_margin:
+            return False
+        first = max(range(len(nodes)), key=lambda i: nodes[i].score or 0.0)
+        return order[0] == first
+
+    def _postprocess_nodes(self, nodes, query_bundle=None):
+        if query_bundle is None:
+            raise ValueError("Reranking needs the query bundle.")
+        self._stats.add(queries=1)
+        if len(nodes) <= self.top_n or self.has_clear_winner(nodes):
+            self._stats.add(skipped=1)
+            return sorted(nodes, key=lambda node: node.score or 0.0, reverse=True)[:self.top_n]
+
+        keys = [ModelCache.make_key(node.node.get_content(metadata_mode=MetadataMode.EMBED).encode("utf-8"),
+                                    self._model, query_bundle.query_str) for node in nodes]
+        scores = {key: float(value) for key, value in self._cache.get_many(list(set(keys))).items()}
+        self._stats.add(cache_hits=sum(1 for key in keys if key in scores))
+
+        missing = {}
+        for key, node in zip(keys, nodes):
+            if key not in scores:
+                missing.setdefault(key, node)
+        if missing:
+            missing_keys = {node.node.node_id: key for key, node in missing.items()}
+            with metrics.timed("chat", "rerank", nodes=len(missing)):
+                metrics.inc("remote_calls_total", service="rerank", stage="rerank")
+                reranked = self._inner.get().postprocess_nodes(list(missing.values()), query_bundle)
+            fresh = {missing_keys[node.node.node_id]: node.score for node in reranked}
+            self._cache.set_many({key: repr(score) for key, score in fresh.items()})
+            scores.update(fresh)
+            self._stats.add(nodes_reranked=len(missing))
+
+        ranked = [NodeWithScore(node=node.node, score=scores[key]) for key, node in zip(keys, nodes) if key in scores]
+        return sorted(ranked, key=lambda node: node.score, reverse=True)[:self.top_n]
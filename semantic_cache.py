@@ -0,0 +1,72 @@
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+
+class SemanticCache:
+    """Cache of rail-checked answers keyed by the embedding of the standalone question.
+
+    A lookup hits when a stored question is at least `threshold` cosine-similar and younger than
+    `ttl` seconds. At most `max_entries` answers are kept, least recently used first out.
+    invalidate() drops everything, e.g. when the index changes.
+    """
+
+    def __init__(self, threshold, ttl, max_entries):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.version = 0
+        self.hits, self.misses = 0, 0
+        self._entries = OrderedDict()
+        self._next_key = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, embedding):
+        """Return the cached answer for the most similar live question, or None."""
+        query = self._normalize(embedding)
+        now = time.time()
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if now - entry["created_at"] > self.ttl]:
+                del self._entries[key]
+            if self._entries:
+                keys = list(self._entries)
+                similarities = np.stack([self._entries[key]["embedding"] for key in keys]) @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    self._entries.move_to_end(keys[best])
+                    self.hits += 1
+                    return self._entries[keys[best]]["answer"]
+            self.misses += 1
+            return None
+
+    def store(self, question, embedding, answer, version):
+        """Cache an answer computed against index `version`; stale versions are ignored."""
+        with self._lock:
+            if version != self.version:
+                return
+            self._entries[self._next_key] = {
+                "question": question,
+                "embedding": self._normalize(embedding),
+                "answer": answer,
+                "created_at": time.time(),
+            }
+            self._next_key += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        """Drop every cached answer and bump the version."""
+        with self._lock:
+            self._entries.clear()
+            self.version += 1
+
+    def stats(self):
+        """Return hit/miss counters and the current number of entries."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries), "version": self.version}
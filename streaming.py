@@ -0,0 +1,92 @@
+import asyncio
+import threading
+
+SENTENCE_ENDINGS = (".", "!", "?", "\n")
+
+async def iterate_in_thread(iterator, executor=None):
+    """Consume a blocking iterator in a worker thread of executor and yield its items asynchronously."""
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    stop = threading.Event()
+    done = object()
+
+    def pump():
+        try:
+            for item in iterator:
+                if stop.is_set():
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, done)
+
+    worker = loop.run_in_executor(executor, pump)
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            yield item
+    finally:
+        stop.set()
+    await worker
+
+class StreamGuard:
+    """Runs output rails on a streamed answer in chunks so a blocked answer can be retracted.
+
+    check is an async callable taking the text streamed so far and returning None when it is
+    allowed, or the replacement message when it is blocked. An optional term_stream (see
+    term_matcher.TermStream) is fed every delta and blocks the answer with blocked_message as
+    soon as a blocked term appears, without waiting for a chunk check.
+    """
+
+    def __init__(self, check, chunk_chars, term_stream=None, blocked_message=None):
+        self.check = check
+        self.chunk_chars = chunk_chars
+        self.term_stream = term_stream
+        self.blocked_message = blocked_message
+        self.text = ""
+        self._checked_len = 0
+        self._pending = []
+        self._replacement = None
+
+    def feed(self, delta):
+        """Add a streamed delta and start a background check at chunk boundaries."""
+        self.text += delta
+        if self.term_stream is not None and self.term_stream.feed(delta) and self._replacement is None:
+            self._replacement = self.blocked_message
+        if (len(self.text) - self._checked_len >= self.chunk_chars
+                and self.text.rstrip(" ").endswith(SENTENCE_ENDINGS)):
+            self._schedule()
+
+    def _schedule(self):
+        self._checked_len = len(self.text)
+        self._pending.append(asyncio.ensure_future(self.check(self.text)))
+
+    def blocked(self):
+        """Return the replacement message if a finished chunk check blocked the answer."""
+        still_pending = []
+        for task in self._pending:
+            if not task.done():
+                still_pending.append(task)
+            elif self._replacement is None and task.result() is not None:
+                self._replacement = task.result()
+        self._pending = still_pending
+        return self._replacement
+
+    async def finish(self):
+        """Check the full answer, wait for outstanding chunk checks and return any replacement."""
+        if self.term_stream is not None and self.term_stream.finish() and self._replacement is None:
+            self._replacement = self.blocked_message
+        if self._replacement is None and len(self.text) > self._checked_len:
+            self._schedule()
+        for result in await asyncio.gather(*self._pending):
+            if self._replacement is None and result is not None:
+                self._replacement = result
+        self._pending = []
+        return self._replacement
+
+    def cancel(self):
+        """Cancel chunk checks that are no longer needed."""
+        for task in self._pending:
+            task.cancel()
+        self._pending = []
@@ -0,0 +1,115 @@
+import os
+from collections import deque
+from functools import lru_cache
+from config import RAILS_CONFIG
+
+def _is_word_char(c):
+    return c.isalnum() or c == "_"
+
+def _normalize(text):
+    """Case-fold a term and collapse its whitespace runs to single spaces."""
+    return " ".join(text.casefold().split())
+
+class TermMatcher:
+    """Aho-Corasick automaton for case-insensitive, whole-word matching of many terms at once.
+
+    Scanning is linear in the text length whatever the number of terms, and can be done
+    incrementally on streamed chunks through stream().
+    """
+
+    def __init__(self, terms):
+        self.terms = sorted({_normalize(term) for term in terms if term.strip()})
+        self.max_term_len = max((len(term) for term in self.terms), default=0)
+        self._goto, self._fail, self._out = [{}], [0], [[]]
+        for term_id, term in enumerate(self.terms):
+            state = 0
+            for c in term:
+                if c not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[state][c] = len(self._goto) - 1
+                state = self._goto[state][c]
+            self._out[state].append(term_id)
+        self._build_failure_links()
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for c, child in self._goto[state].items():
+                queue.append(child)
+                fail = self._fail[state]
+                while fail and c not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(c, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    @classmethod
+    def from_file(cls, path):
+        """Load terms from a text file, one per line; blank lines and # comments are ignored."""
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(line.strip() for line in f if line.strip() and not line.lstrip().startswith("#"))
+
+    def stream(self):
+        """Return an incremental scanner for text that arrives in chunks."""
+        return TermStream(self)
+
+    def find_all(self, text):
+        """Return the set of terms found in a text."""
+        scanner = self.stream()
+        scanner.feed(text)
+        return scanner.finish()
+
+    def contains(self, text):
+        """Check whether any term occurs in a text."""
+        return bool(self.find_all(text))
+
+class TermStream:
+    """Incremental TermMatcher scan; matches may span chunk boundaries."""
+
+    def __init__(self, matcher):
+        self.matcher = matcher
+        self.matches = set()
+        self._state = 0
+        self._recent = deque([" "], maxlen=matcher.max_term_len + 1)
+        self._pending = []
+
+    def feed(self, chunk):
+        """Scan the next chunk and return every term confirmed so far."""
+        goto, fail, out, terms = self.matcher._goto, self.matcher._fail, self.matcher._out, self.matcher.terms
+        state, recent, pending = self._state, self._recent, self._pending
+        for c in chunk.casefold():
+            if c.isspace():
+                if recent[-1] == " ":
+                    continue
+                c = " "
+            if pending:
+                if not _is_word_char(c):
+                    self.matches.update(pending)
+                pending = []
+            recent.append(c)
+            while state and c not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(c, 0)
+            for term_id in out[state]:
+                term = terms[term_id]
+                before = recent[-len(term) - 1] if len(recent) > len(term) else " "
+                if not _is_word_char(before):
+                    pending.append(term)
+        self._state, self._pending = state, pending
+        return self.matches
+
+    def finish(self):
+        """Flush matches that end at the end of the text and return every term found."""
+        self.matches.update(self._pending)
+        self._pending = []
+        return self.matches
+
+@lru_cache(maxsize=None)
+def load_blocked_terms(path=None):
+    """Load and compile the blocked terms once per process."""
+    path = path or RAILS_CONFIG["blocked_terms_path"]
+    if not os.path.exists(path):
+        return TermMatcher([])
+    return TermMatcher.from_file(path)
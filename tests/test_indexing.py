@@ -0,0 +1,159 @@
+import os
+import chromadb
+import pytest
+from llama_index.core import Document, MockEmbedding, Settings
+from llama_index.core.node_parser import SentenceSplitter
+from indexing import IndexManager
+
+class RecordingEmbedding(MockEmbedding):
+    """MockEmbedding that records the texts it embeds."""
+
+    texts: list = []
+
+    def _get_text_embeddings(self, texts):
+        self.texts.extend(texts)
+        return super()._get_text_embeddings(texts)
+
+@pytest.fixture(autouse=True)
+def mock_settings():
+    Settings.embed_model = RecordingEmbedding(embed_dim=8)
+    Settings.node_parser = SentenceSplitter()
+
+def make_manager(tmp_path, **kwargs):
+    client = chromadb.PersistentClient(path=str(tmp_path / "chroma"))
+    kwargs.setdefault("gc_grace_seconds", 0)
+    return IndexManager(client, "test", str(tmp_path / "manifest.json"), document_batch_size=1, write_batch_size=1,
+                        **kwargs)
+
+def documents(*texts):
+    return lambda: (Document(text=text) for text in texts)
+
+def visible_texts(manager, snapshot):
+    """Texts of the nodes a snapshot sees in Chroma and in the BM25 index."""
+    where = {"$and": [{"index_version": {"$lte": snapshot.version}}, {"removed_version": {"$gt": snapshot.version}}]}
+    texts = set(manager.collection.get(where=where, include=["documents"])["documents"])
+    lexical = {manager.collection.get(ids=[node_id], include=["documents"])["documents"][0]
+               for node_id, _ in manager.lexical_index.search("alpha beta gamma", 10, version=snapshot.version)}
+    assert lexical == texts
+    return texts
+
+def stored_ids(manager, source):
+    node_ids = manager.manifest.node_ids(source)
+    return set(manager.collection.get(ids=node_ids, include=[])["ids"]), set(node_ids)
+
+def test_add_update_and_remove(tmp_path):
+    manager = make_manager(tmp_path)
+    assert manager.ingest("a.txt", "v1", documents("alpha", "beta")) == "added"
+    assert manager.ingest("a.txt", "v1", documents("alpha", "beta")) == "skipped"
+    first = manager.acquire()
+    assert visible_texts(manager, first) == {"alpha", "beta"}
+
+    assert manager.ingest("a.txt", "v2", documents("alpha", "gamma")) == "updated"
+    second = manager.acquire()
+    assert visible_texts(manager, second) == {"alpha", "gamma"}
+    # The pinned snapshot keeps seeing its version until it is released.
+    assert visible_texts(manager, first) == {"alpha", "beta"}
+    assert manager.collection.count() == 3
+    first.release()
+    assert manager.collection.count() == 2
+
+    assert manager.remove_source("a.txt")
+    assert not manager.remove_source("a.txt")
+    second.release()
+    assert manager.is_empty()
+    assert manager.collection.count() == 0
+
+def test_revert_reuses_removed_nodes(tmp_path):
+    manager = make_manager(tmp_path)
+    manager.ingest("a.txt", "v1", documents("alpha", "beta"))
+    snapshot = manager.acquire()
+    manager.ingest("a.txt", "v2", documents("alpha"))
+    manager.ingest("a.txt", "v1", documents("alpha", "beta"))
+    assert manager.collection.count() == 2
+    snapshot.release()
+    assert visible_texts(manager, manager.acquire()) == {"alpha", "beta"}
+
+def test_release_during_revert_keeps_reused_nodes(tmp_path):
+    manager = make_manager(tmp_path)
+    manager.ingest("a.txt", "v1", documents("alpha", "beta"))
+    snapshot = manager.acquire()
+    manager.ingest("a.txt", "v2", documents("alpha"))
+
+    def revert():
+        yield Document(text="alpha")
+        yield Document(text="beta")
+        # A chat session ends while the reused "beta" node waits for the commit.
+        snapshot.release()
+    manager.ingest("a.txt", "v1", revert)
+
+    present, listed = stored_ids(manager, "a.txt")
+    assert present == listed and len(listed) == 2
+    assert visible_texts(manager, manager.acquire()) == {"alpha", "beta"}
+    assert manager.ingest("a.txt", "v1", documents("alpha", "beta")) == "skipped"
+
+def test_interrupted_ingest_resumes_from_checkpoint(tmp_path):
+    manager = make_manager(tmp_path)
+    saved_at = os.stat(manager.manifest.path).st_mtime_ns
+
+    def interrupted():
+        yield Document(text="alpha")
+        yield Document(text="beta")
+        raise RuntimeError("upload interrupted")
+    with pytest.raises(RuntimeError):
+        manager.ingest("a.txt", "v1", interrupted)
+    assert manager.is_empty()
+    # Batches are checkpointed in the source's log; the manifest itself is only written at commit.
+    assert os.stat(manager.manifest.path).st_mtime_ns == saved_at
+    written = set(manager.manifest.node_ids("a.txt"))
+    assert len(written) == 2
+
+    # A new process resumes without embedding the checkpointed nodes again.
+    resumed = make_manager(tmp_path)
+    Settings.embed_model.texts.clear()
+    assert resumed.ingest("a.txt", "v1", documents("alpha", "beta", "gamma")) == "added"
+    assert Settings.embed_model.texts == ["gamma"]
+    assert visible_texts(resumed, resumed.acquire()) == {"alpha", "beta", "gamma"}
+    assert os.listdir(resumed.manifest.checkpoint_dir) == []
+
+def test_remove_unfinished_source(tmp_path):
+    manager = make_manager(tmp_path)
+
+    def interrupted():
+        yield Document(text="alpha")
+        raise RuntimeError("upload interrupted")
+    with pytest.raises(RuntimeError):
+        manager.ingest("a.txt", "v1", interrupted)
+    assert manager.remove_source("a.txt")
+    assert manager.collection.count() == 0
+    assert manager.manifest.node_ids("a.txt") == []
+
+def test_workers_catch_up_through_the_manifest(tmp_path):
+    writer, reader = make_manager(tmp_path), make_manager(tmp_path)
+    changes = []
+    reader.on_change(lambda: changes.append(reader.version))
+    writer.ingest("a.txt", "v1", documents("alpha"))
+    reader.sync()
+    assert changes == [writer.version]
+    snapshot = reader.acquire()
+    assert snapshot.version == writer.version
+    assert visible_texts(reader, snapshot) == {"alpha"}
+
+def test_restart_keeps_reused_nodes_of_unfinished_ingest(tmp_path):
+    manager = make_manager(tmp_path)
+    manager.ingest("a.txt", "v1", documents("alpha", "beta"))
+    manager.acquire()
+    manager.ingest("a.txt", "v2", documents("alpha"))
+
+    def interrupted():
+        yield Document(text="alpha")
+        yield Document(text="beta")
+        raise RuntimeError("upload interrupted")
+    with pytest.raises(RuntimeError):
+        manager.ingest("a.txt", "v1", interrupted)
+
+    # Recovery must not collect the removed "beta" node the unfinished ingest is reusing.
+    resumed = make_manager(tmp_path)
+    resumed.acquire().release()
+    assert resumed.ingest("a.txt", "v1", documents("alpha", "beta")) == "updated"
+    present, listed = stored_ids(resumed, "a.txt")
+    assert present == listed and len(listed) == 2
@@ -0,0 +1,37 @@
+import math
+from lexical import BM25Index, tokenize, reciprocal_rank_fusion
+
+def test_tokenize_splits_compound_codes():
+    assert tokenize("Reset the RT-AC68U") == ["reset", "the", "rt-ac68u", "rt", "ac68u"]
+
+def test_search_ranks_matching_nodes():
+    index = BM25Index()
+    index.add([("a", "router reset procedure"), ("b", "printer toner"), ("c", "router firmware router")])
+    assert [node_id for node_id, _ in index.search("router", 10)] == ["c", "a"]
+    assert index.search("scanner", 10) == []
+
+def test_visibility_follows_versions():
+    index = BM25Index()
+    index.add([("old", "router reset")], added=1, removed=3)
+    index.add([("new", "router reset steps")], added=3)
+    index.add([("pending", "router reset draft")], added=math.inf)
+    assert [node_id for node_id, _ in index.search("router", 10, version=2)] == ["old"]
+    assert [node_id for node_id, _ in index.search("router", 10, version=3)] == ["new"]
+    index.set_visibility(["pending"], added=4)
+    assert {node_id for node_id, _ in index.search("router", 10, version=4)} == {"new", "pending"}
+    # Without a version every indexed node is searched.
+    assert len(index.search("router", 10)) == 3
+
+def test_remove_and_replace():
+    index = BM25Index()
+    index.add([("a", "router"), ("b", "router")])
+    index.remove(["a"])
+    assert len(index) == 1
+    index.add([("b", "printer")])
+    assert index.search("router", 10) == []
+    assert [node_id for node_id, _ in index.search("printer", 10)] == ["b"]
+
+def test_reciprocal_rank_fusion_favours_agreement():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]])
+    assert fused[0][0] == "b"
+    assert {node_id for node_id, _ in fused} == {"a", "b", "c", "d"}
@@ -0,0 +1,73 @@
+from llama_index.core.llms import ChatMessage, MessageRole
+from memory import ConversationMemory, message_tokens
+
+class FakeLLM:
+    def __init__(self, reply="summary", fail=False):
+        self.reply, self.fail, self.calls = reply, fail, []
+
+    def predict(self, prompt, **kwargs):
+        self.calls.append(kwargs)
+        if self.fail:
+            raise RuntimeError("LLM unavailable")
+        return self.reply
+
+PINNED = [ChatMessage(role=MessageRole.USER, content="You assist field technicians.")]
+
+def add_turns(memory, count):
+    for i in range(count):
+        memory.add(MessageRole.USER, f"Question {i} about the router " + "x" * 80)
+        memory.add(MessageRole.ASSISTANT, f"Answer {i} about the router " + "y" * 80)
+
+def test_unbounded_without_budget():
+    memory = ConversationMemory(FakeLLM(), PINNED)
+    add_turns(memory, 20)
+    assert len(memory.window) == 40
+    assert not memory.needs_compaction()
+
+def test_eviction_keeps_the_window_within_budget():
+    memory = ConversationMemory(FakeLLM(), PINNED, token_budget=300, summary_tokens=50)
+    budget = memory._window_budget()
+    add_turns(memory, 20)
+    assert sum(message_tokens(message) for message in memory.window) <= budget
+    assert memory.needs_compaction()
+    assert memory.window[-1].content.startswith("Answer 19")
+
+def test_eviction_frees_a_quarter_of_the_window():
+    memory = ConversationMemory(FakeLLM(), PINNED, token_budget=300, summary_tokens=50)
+    budget = memory._window_budget()
+    while not memory.needs_compaction():
+        memory.add(MessageRole.USER, "Another question about the router " + "x" * 80)
+    # Evicting below the budget lets several turns fit before the next summary.
+    assert sum(message_tokens(message) for message in memory.window) <= budget * 3 // 4
+
+def test_latest_exchange_always_stays():
+    memory = ConversationMemory(FakeLLM(), PINNED, token_budget=60, summary_tokens=10)
+    add_turns(memory, 3)
+    assert [message.content[:8] for message in memory.window] == ["Question", "Answer 2"]
+
+def test_compact_folds_evicted_messages_into_the_summary():
+    llm = FakeLLM(reply="Router model RT-AC68U, reboot tried.")
+    memory = ConversationMemory(llm, PINNED, token_budget=300, summary_tokens=50)
+    add_turns(memory, 20)
+    evicted = len(memory.evicted)
+    memory.compact()
+    assert not memory.needs_compaction()
+    assert len(llm.calls) == 1 and llm.calls[0]["summary"] == "(none)"
+    assert llm.calls[0]["conversation"].count("Question") == (evicted + 1) // 2
+    messages = memory.messages()
+    assert messages[0] is PINNED[0]
+    assert messages[1].role == MessageRole.SYSTEM and "RT-AC68U" in messages[1].content
+    assert memory.tokens() <= memory.token_budget
+
+def test_summary_is_truncated_to_its_share():
+    memory = ConversationMemory(FakeLLM(reply="z" * 1000), PINNED, token_budget=300, summary_tokens=50)
+    add_turns(memory, 20)
+    memory.compact()
+    assert len(memory.summary) == 200
+
+def test_failed_summary_drops_evicted_messages():
+    memory = ConversationMemory(FakeLLM(fail=True), PINNED, token_budget=300, summary_tokens=50)
+    add_turns(memory, 20)
+    memory.compact()
+    assert memory.summary == ""
+    assert not memory.needs_compaction()
@@ -0,0 +1,67 @@
+import asyncio
+from streaming import StreamGuard, iterate_in_thread
+from term_matcher import TermMatcher
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+def make_check(blocked_word, calls):
+    async def check(text):
+        calls.append(text)
+        await asyncio.sleep(0)
+        return "Sorry, I can't share that." if blocked_word in text else None
+    return check
+
+def test_chunks_are_checked_at_sentence_ends():
+    async def scenario():
+        calls = []
+        guard = StreamGuard(make_check("secret", calls), chunk_chars=10)
+        for delta in ["The router ", "reboots. ", "Then it ", "resyncs."]:
+            guard.feed(delta)
+            await asyncio.sleep(0)
+        assert await guard.finish() is None
+        return calls
+    assert run(scenario()) == ["The router reboots. ", "The router reboots. Then it resyncs."]
+
+def test_blocked_chunk_retracts_the_answer():
+    async def scenario():
+        calls = []
+        guard = StreamGuard(make_check("secret", calls), chunk_chars=10)
+        replacement = None
+        for delta in ["The secret ", "code is 1234. ", "More text", " follows."]:
+            guard.feed(delta)
+            await asyncio.sleep(0.01)
+            replacement = guard.blocked()
+            if replacement is not None:
+                guard.cancel()
+                break
+        return replacement, guard.text
+    replacement, text = run(scenario())
+    assert replacement == "Sorry, I can't share that."
+    assert "More text" not in text
+
+def test_blocked_term_stops_before_any_chunk_check():
+    async def scenario():
+        calls = []
+        guard = StreamGuard(make_check("secret", calls), chunk_chars=1000,
+                            term_stream=TermMatcher(["root password"]).stream(), blocked_message="Blocked.")
+        guard.feed("The root pass")
+        assert guard.blocked() is None
+        guard.feed("word is")
+        return guard.blocked(), calls
+    assert run(scenario()) == ("Blocked.", [])
+
+def test_unbounded_chunks_check_the_answer_once():
+    async def scenario():
+        calls = []
+        guard = StreamGuard(make_check("secret", calls), chunk_chars=float("inf"))
+        for delta in ["One. ", "Two. ", "Three."]:
+            guard.feed(delta)
+        assert await guard.finish() is None
+        return calls
+    assert run(scenario()) == ["One. Two. Three."]
+
+def test_iterate_in_thread_yields_in_order():
+    async def scenario():
+        return [item async for item in iterate_in_thread(iter(range(5)))]
+    assert run(scenario()) == [0, 1, 2, 3, 4]
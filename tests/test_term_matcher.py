@@ -0,0 +1,35 @@
+from term_matcher import TermMatcher
+
+MATCHER = TermMatcher(["root password", "rm -rf", "exploit", "he", "hers"])
+
+def test_whole_words_only():
+    assert MATCHER.find_all("Use this EXPLOIT now") == {"exploit"}
+    assert MATCHER.find_all("exploits and exploited are different words") == set()
+    assert MATCHER.find_all("the theme") == set()
+    assert MATCHER.find_all("he said hers") == {"he", "hers"}
+
+def test_whitespace_and_case_are_normalized():
+    assert MATCHER.find_all("the Root\n\t  Password is") == {"root password"}
+    assert MATCHER.contains("run rm -rf /")
+
+def test_matches_span_chunks():
+    stream = MATCHER.stream()
+    assert stream.feed("Enter the ro") == set()
+    assert stream.feed("ot pass") == set()
+    # A term at the end of a chunk is only confirmed once the next character ends the word.
+    assert stream.feed("word") == set()
+    assert stream.feed(".") == {"root password"}
+
+def test_match_at_end_needs_finish():
+    stream = MATCHER.stream()
+    assert stream.feed("try the exploit") == set()
+    assert stream.finish() == {"exploit"}
+
+def test_prefix_split_across_chunks_is_not_a_match():
+    stream = MATCHER.stream()
+    stream.feed("exploit")
+    stream.feed("ation")
+    assert stream.finish() == set()
+
+def test_empty_matcher():
+    assert TermMatcher(["", "  "]).find_all("anything") == set()
@@ -0,0 +1,59 @@
+from io import BytesIO
+import random
+import fitz
+from PIL import Image
+import utils
+from cache import ModelCache
+from metrics import metrics
+from triage import ImageTriage, CHART, SKIP
+from config import TRIAGE_CONFIG
+
+def pdf_chart_png():
+    """A bar chart with gridlines and labels, rasterised from a PDF page like embedded charts are."""
+    doc = fitz.open()
+    page = doc.new_page(width=400, height=260)
+    page.insert_text((120, 20), "Throughput by site (Mbps)", fontsize=11)
+    for k in range(5):
+        y = 220 - k * 40
+        page.draw_line((40, y), (380, y), color=(0.85, 0.85, 0.85), width=0.5)
+        page.insert_text((10, y + 3), str(k * 40), fontsize=8)
+    colors = [(0.12, 0.47, 0.71), (1, 0.5, 0.05), (0.17, 0.63, 0.17)]
+    for i, height in enumerate([120, 95, 143, 80, 160, 60]):
+        page.draw_rect(fitz.Rect(55 + i * 55, 220 - height, 90 + i * 55, 220), color=None, fill=colors[i % 3])
+        page.insert_text((58 + i * 55, 235), f"Site {i + 1}", fontsize=8)
+    page.draw_line((40, 220), (380, 220), color=(0, 0, 0), width=1)
+    page.draw_line((40, 40), (40, 220), color=(0, 0, 0), width=1)
+    return page.get_pixmap(dpi=144).tobytes("png")
+
+def photo_png():
+    rng = random.Random(0)
+    img = Image.new("RGB", (320, 240))
+    img.putdata([((90 + x) % 256, (120 + y) % 256, rng.randint(0, 255)) for y in range(240) for x in range(320)])
+    out = BytesIO()
+    img.save(out, format="PNG")
+    return out.getvalue()
+
+def test_chart_is_routed_to_deplot():
+    triage = ImageTriage(TRIAGE_CONFIG)
+    assert triage.classify(pdf_chart_png()) == CHART
+    assert 'image_triage_total{outcome="routed_chart"}' in metrics.render()
+
+def test_photo_is_not_routed_to_deplot():
+    assert ImageTriage(TRIAGE_CONFIG).classify(photo_png()) != CHART
+
+def test_repeats_are_counted_per_document():
+    triage, chart = ImageTriage(TRIAGE_CONFIG), pdf_chart_png()
+    assert [triage.classify(chart) for _ in range(4)] == [CHART] * 4
+    for _ in range(3):
+        with triage.document(triage.new_document()):
+            verdicts = [triage.classify(chart) for _ in range(4)]
+        assert verdicts == [CHART, CHART, SKIP, SKIP]
+
+def test_cached_explanation_is_used_before_triage(tmp_path, monkeypatch):
+    cache = ModelCache(str(tmp_path / "model_cache.db"), 1024 * 1024)
+    monkeypatch.setattr(utils, "model_cache", cache)
+    monkeypatch.setattr(utils, "process_graph", lambda image_content: "remote call")
+    chart = pdf_chart_png()
+    cache.set(cache.make_key(chart, utils.GRAPH_EXPLANATION_MODEL, utils.EXPLAIN_TABLE_PROMPT), "cached")
+    with utils.image_triage.document(utils.image_triage.new_document()):
+        assert [utils.describe_graph_if_any(chart) for _ in range(4)] == ["cached"] * 4
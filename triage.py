@@ -0,0 +1,108 @@
+import threading
+import contextvars
+from io import BytesIO
+from contextlib import contextmanager
+from collections import Counter, OrderedDict
+from PIL import Image
+from metrics import metrics
+from config import TRIAGE_CONFIG
+
+SKIP, CHART, UNKNOWN = "skip", "chart", "unknown"
+
+_document_hashes = contextvars.ContextVar("triage_document_hashes", default=None)
+
+class ImageTriage:
+    """Cheap CPU-only classification of images before any remote model call.
+
+    classify() returns SKIP for tiny, undecodable, repeated decorative or photo-like images,
+    CHART for images that look like charts or tables (light background, few flat colours), and
+    UNKNOWN when the VLM still has to decide. Images only count as repeated within one document:
+    callers wrap the classification of a document's images in document(), and outside of it
+    nothing is repeated. Outcomes are counted in the image_triage_total metric.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def new_document():
+        """Return the repeat counts of a new document, to pass to document()."""
+        return OrderedDict()
+
+    @contextmanager
+    def document(self, seen_hashes):
+        """Count images classified in this context (and threads started with a copy of it) in seen_hashes."""
+        token = _document_hashes.set(seen_hashes)
+        try:
+            yield
+        finally:
+            _document_hashes.reset(token)
+
+    @staticmethod
+    def difference_hash(gray):
+        """64-bit perceptual dHash of a grayscale image."""
+        pixels = list(gray.resize((9, 8)).getdata())
+        value = 0
+        for row in range(8):
+            for col in range(8):
+                value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+        return value
+
+    def features(self, image_content):
+        """Return size, near-white fraction, colour count and dHash of an image."""
+        img = Image.open(BytesIO(image_content))
+        img.draft("RGB", (256, 256))
+        width, height = img.size
+        small = img.convert("RGB").resize((64, 64))
+        gray = small.convert("L")
+        white_fraction = sum(gray.histogram()[230:]) / (64 * 64)
+        colors = len(small.point(lambda v: v & 0xF0).getcolors(64 * 64))
+        return {"width": width, "height": height, "white_fraction": white_fraction,
+                "colors": colors, "dhash": self.difference_hash(gray)}
+
+    def _is_repeated(self, dhash):
+        seen_hashes = _document_hashes.get()
+        if seen_hashes is None:
+            return False
+        with self._lock:
+            count = seen_hashes.pop(dhash, 0) + 1
+            seen_hashes[dhash] = count
+            while len(seen_hashes) > self.config["max_tracked_hashes"]:
+                seen_hashes.popitem(last=False)
+        return count > self.config["decorative_repeats"]
+
+    def classify(self, image_content):
+        """Classify an image as SKIP, CHART or UNKNOWN."""
+        try:
+            features = self.features(image_content)
+        except Exception:
+            return self._record("skipped_undecodable", SKIP)
+        if min(features["width"], features["height"]) < self.config["min_side"]:
+            return self._record("skipped_tiny", SKIP)
+        if self._is_repeated(features["dhash"]):
+            return self._record("skipped_decorative", SKIP)
+        if (features["white_fraction"] >= self.config["chart_min_white_fraction"]
+                and features["colors"] <= self.config["chart_max_colors"]):
+            return self._record("routed_chart", CHART)
+        if (features["white_fraction"] <= self.config["photo_max_white_fraction"]
+                and features["colors"] >= self.config["photo_min_colors"]):
+            return self._record("skipped_photo", SKIP)
+        return self._record("sent_to_vlm", UNKNOWN)
+
+    def _record(self, outcome, verdict):
+        with self._lock:
+            self.counts[outcome] += 1
+            if verdict != UNKNOWN:
+                # Each of these would have cost at least one full VLM description.
+                self.counts["remote_calls_avoided"] += 1
+        metrics.inc("image_triage_total", outcome=outcome)
+        return verdict
+
+    def stats(self):
+        """Return a copy of the triage counters."""
+        with self._lock:
+            return dict(self.counts)
+
+image_triage = ImageTriage(TRIAGE_CONFIG)
@@ -1,16 +1,23 @@
 import os
 import base64
-import fitz
 from io import BytesIO
 from PIL import Image
-import requests
 from dotenv import find_dotenv, load_dotenv
 from llama_index.llms.nvidia import NVIDIA
-from config import LLM_CONFIG
+from config import LLM_CONFIG, TRIAGE_CONFIG
+from cache import model_cache
+from model_client import model_client
+from triage import image_triage, CHART, SKIP
+from metrics import metrics, estimate_tokens
 
 # Load environment variables from .env file if it exists
 load_dotenv(find_dotenv(raise_error_if_not_found=False))
 
+DESCRIBE_IMAGE_PROMPT = "Describe this image."
+DEPLOT_PROMPT = "Generate underlying data of this figure:"
+EXPLAIN_TABLE_PROMPT = "Explain the following linearized table for LLM usage: "
+GRAPH_EXPLANATION_MODEL = f'{LLM_CONFIG["graph_model"]}+{LLM_CONFIG["llm"]}'
+
 def set_environment_variables():
     """Set necessary environment variables."""
     os.environ["NVIDIA_API_KEY"] = os.getenv("NVIDIA_API_KEY")
@@ -29,30 +36,49 @@ def is_graph(image_content):
 
 def process_graph(image_content):
     """Generate a description of a graph image."""
-    deplot_description = process_graph_deplot(image_content)
-    llm = NVIDIA(model_name=LLM_CONFIG["llm"])
-    response = llm.complete(
-        "Explain the following linearized table for LLM usage: " + deplot_description
-    )
-    return response.text
+    def explain_graph():
+        deplot_description = process_graph_deplot(image_content)
+        llm = NVIDIA(model_name=LLM_CONFIG["llm"])
+        prompt = EXPLAIN_TABLE_PROMPT + deplot_description
+        with metrics.timed("ingest", "explain_table"):
+            metrics.inc("remote_calls_total", service="llm", stage="explain_table")
+            response = llm.complete(prompt)
+        count_tokens("ingest", "explain_table", prompt, response.text)
+        return response.text
+
+    return model_cache.get_or_compute(image_content, GRAPH_EXPLANATION_MODEL, EXPLAIN_TABLE_PROMPT, explain_graph)
+
+def count_tokens(pipeline, stage, prompt, completion=""):
+    """Record the estimated prompt and completion tokens of a model call."""
+    metrics.inc("tokens_total", estimate_tokens(prompt), pipeline=pipeline, stage=stage, direction="prompt")
+    if completion:
+        metrics.inc("tokens_total", estimate_tokens(completion), pipeline=pipeline, stage=stage, direction="completion")
+
+def post_image(stage, url, prompt, image_content, payload):
+    """Send an image with a prompt to a vision model endpoint and return the reply text."""
+    image_b64 = get_b64_image_from_content(image_content)
+    payload = {"messages": [{"role": "user", "content": f'{prompt} <img src="data:image/png;base64,{image_b64}" />'}],
+               **payload}
+    with metrics.timed("ingest", stage):
+        metrics.inc("remote_calls_total", service=stage, stage=stage)
+        metrics.inc("bytes_total", len(image_b64), pipeline="ingest", kind=f"{stage}_request")
+        response = model_client.post(url, payload)
+    content = response["choices"][0]['message']['content']
+    count_tokens("ingest", stage, prompt, content)
+    return content
 
 def describe_image(image_content):
     """Generate a description of an image using NVIDIA API."""
-    api_key = os.getenv("NVIDIA_API_KEY")
-    if not api_key:
-        raise ValueError("NVIDIA API Key is not set. Please set NVIDIA_API_KEY.")
+    return model_cache.get_or_compute(
+        image_content, LLM_CONFIG["image_model"], DESCRIBE_IMAGE_PROMPT,
+        lambda: _request_image_description(image_content)
+    )
 
-    image_b64 = get_b64_image_from_content(image_content)
-    response = requests.post(
-        LLM_CONFIG["image_model_api"],
-        headers={"Authorization": f"Bearer {api_key}", "Accept": "application/json"},
-        json={
-            "messages": [
-                {
-                    "role": "user",
-                    "content": f'Describe this image. <img src="data:image/png;base64,{image_b64}" />'
-                }
-            ],
+def _request_image_description(image_content):
+    """Send an image to the NVIDIA image model and return its description."""
+    return post_image(
+        "vlm", LLM_CONFIG["image_model_api"], DESCRIBE_IMAGE_PROMPT, image_content,
+        {
             "max_tokens": 1024,
             "temperature": 0.2,
             "top_p": 0.7,
@@ -60,81 +86,71 @@ def describe_image(image_content):
             "stream": False
         }
     )
-    return response.json()["choices"][0]['message']['content']
 
 def process_graph_deplot(image_content):
     """Generate data from a graph image using NVIDIA's Deplot API."""
-    api_key = os.getenv("NVIDIA_API_KEY")
-    if not api_key:
-        raise ValueError("NVIDIA API Key is not set. Please set NVIDIA_API_KEY.")
+    return model_cache.get_or_compute(
+        image_content, LLM_CONFIG["graph_model"], DEPLOT_PROMPT,
+        lambda: _request_graph_data(image_content)
+    )
 
-    image_b64 = get_b64_image_from_content(image_content)
-    response = requests.post(
-        LLM_CONFIG["graph_model_api"],
-        headers={"Authorization": f"Bearer {api_key}", "Accept": "application/json"},
-        json={
-            "messages": [
-                {
-                    "role": "user",
-                    "content": f'Generate underlying data of this figure: <img src="data:image/png;base64,{image_b64}" />'
-                }
-            ],
+def _request_graph_data(image_content):
+    """Send a graph image to the NVIDIA Deplot model and return its data table."""
+    return post_image(
+        "deplot", LLM_CONFIG["graph_model_api"], DEPLOT_PROMPT, image_content,
+        {
             "max_tokens": 1024,
             "temperature": 0.2,
             "top_p": 0.2,
             "stream": False
         }
     )
-    return response.json()["choices"][0]['message']['content']
 
-def extract_text_around_item(text_blocks, bbox, page_height, threshold_percentage=0.1):
-    """Extract text immediately above and below a bounding box."""
-    before_text, after_text = "", ""
+def describe_graph_if_any(image_content):
+    """Return a graph explanation for graph images and an empty string otherwise.
+
+    Images explained or described before are answered from the model cache. Others are triaged
+    locally first: likely charts go straight to deplot, and tiny, decorative or photo-like images
+    never reach a remote model.
+    """
+    explanation = model_cache.lookup(image_content, GRAPH_EXPLANATION_MODEL, EXPLAIN_TABLE_PROMPT)
+    if explanation is not None:
+        return explanation
+    description = model_cache.lookup(image_content, LLM_CONFIG["image_model"], DESCRIBE_IMAGE_PROMPT)
+    if description is not None:
+        return process_graph(image_content) if is_graph(image_content) else ""
+    if TRIAGE_CONFIG["enabled"]:
+        verdict = image_triage.classify(image_content)
+        if verdict == CHART:
+            return process_graph(image_content)
+        if verdict == SKIP:
+            return ""
+    return process_graph(image_content) if is_graph(image_content) else ""
+
+def describe_graphs(image_contents, check_graph=True):
+    """Explain many graph images concurrently, preserving input order."""
+    return model_client.map(describe_graph_if_any if check_graph else process_graph, image_contents)
+
+def extract_text_around_item(layout, bbox, page_height, threshold_percentage=0.1):
+    """Extract the text blocks nearest above and below a bounding box."""
     vertical_thresh = page_height * threshold_percentage
     horiz_thresh = bbox.width * threshold_percentage
+    before = layout.above(bbox, vertical_thresh, horiz_thresh)
+    after = layout.below(bbox, vertical_thresh, horiz_thresh)
+    return before[4] if before else "", after[4] if after else ""
 
-    for block in text_blocks:
-        block_bbox = fitz.Rect(block[:4])
-        vertical_dist = min(abs(block_bbox.y1 - bbox.y0), abs(block_bbox.y0 - bbox.y1))
-        horiz_overlap = max(0, min(block_bbox.x1, bbox.x1) - max(block_bbox.x0, bbox.x0))
-
-        if vertical_dist <= vertical_thresh and horiz_overlap >= -horiz_thresh:
-            if block_bbox.y1 < bbox.y0 and not before_text:
-                before_text = block[4]
-            elif block_bbox.y0 > bbox.y1 and not after_text:
-                after_text = block[4]
-                break
-
-    return before_text, after_text
-
-def process_text_blocks(text_blocks, char_count_threshold=500):
-    """Group text blocks by character count threshold."""
-    grouped_blocks = []
-    current_group, current_char_count = [], 0
-
-    for block in text_blocks:
-        if block[-1] == 0:  # Check if block is text
-            block_text, block_char_count = block[4], len(block[4])
-            if current_char_count + block_char_count <= char_count_threshold:
-                current_group.append(block)
-                current_char_count += block_char_count
-            else:
-                if current_group:
-                    grouped_blocks.append((current_group[0], "\n".join(b[4] for b in current_group)))
-                current_group, current_char_count = [block], block_char_count
-
-    if current_group:
-        grouped_blocks.append((current_group[0], "\n".join(b[4] for b in current_group)))
-
-    return grouped_blocks
+def process_text_blocks(layout, char_count_threshold=500, exclude_bboxes=()):
+    """Group text blocks into heading-led chunks, leaving out blocks that overlap the given boxes."""
+    exclude = {i for bbox in exclude_bboxes for i in layout.overlapping(bbox)}
+    return layout.chunks(char_count_threshold, exclude)
 
 def save_uploaded_file(uploaded_file):
     """Save an uploaded file to a temporary directory."""
     temp_dir = os.path.join(os.getcwd(), "vectorstore", "ppt_references", "tmp")
     os.makedirs(temp_dir, exist_ok=True)
-    temp_file_path = os.path.join(temp_dir, uploaded_file.name)
+    temp_file_path = os.path.join(temp_dir, os.path.basename(uploaded_file.filename))
     
     with open(temp_file_path, "wb") as temp_file:
-        temp_file.write(uploaded_file.read())
+        temp_file.write(uploaded_file.file.read())
     
     return temp_file_path